@@ -0,0 +1,113 @@
+"""Benchmark the export sink against a local stand-in InfluxDB.
+
+Records readings as fast as a stream would deliver them and reports the
+lines sent, dropped and the write request latency. --outage makes the
+stand-in fail its first seconds of writes to exercise the back-pressure.
+Run from the repository root:
+
+    python -m benchmarks.bench_export [--readings 100000] [--outage 2]
+"""
+
+# ruff: noqa: T201
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+
+from custom_components.envoystream.export import ExportSink
+from custom_components.envoystream.export import HttpExportSender
+
+from .bench_reader import _report
+
+
+class FakeInflux:
+    """Count the lines of /api/v2/write requests."""
+
+    def __init__(self, outage: float) -> None:
+        """Init the server, failing writes for outage seconds."""
+        self.lines = 0
+        self.requests = 0
+        self._failing_until = time.monotonic() + outage
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def _write(self, request: web.Request) -> web.Response:
+        if time.monotonic() < self._failing_until:
+            return web.Response(status=503)
+        body = await request.read()
+        self.requests += 1
+        self.lines += body.count(b"\n") + 1
+        return web.Response(status=204)
+
+    async def __aenter__(self) -> FakeInflux:
+        """Start the server on a free port."""
+        app = web.Application()
+        app.router.add_post("/api/v2/write", self._write)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]  # pylint: disable=protected-access
+        self.url = f"http://127.0.0.1:{port}/api/v2/write?bucket=envoy&precision=ns"
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        """Stop the server."""
+        assert self._runner is not None
+        await self._runner.cleanup()
+
+
+async def _run(args: argparse.Namespace) -> None:
+    data = {f"key_{index}": float(index) for index in range(args.keys)}
+    async with FakeInflux(args.outage) as influx, aiohttp.ClientSession() as session:
+        latencies: list[float] = []
+        sender = HttpExportSender(session, influx.url)
+
+        async def _timed_send(payload: bytes) -> None:
+            start = time.monotonic()
+            await sender(payload)
+            latencies.append(time.monotonic() - start)
+
+        sink = ExportSink(_timed_send, "123456789012", flush_interval=0.1)
+        task = asyncio.create_task(sink.async_run())
+
+        start = time.monotonic()
+        for index in range(args.readings):
+            sink.record(data)
+            if index % 100 == 0:
+                # Readings arrive between other event loop work
+                await asyncio.sleep(0)
+        record_time = time.monotonic() - start
+
+        while sink.as_dict()["pending"] and time.monotonic() - start < 120:
+            await asyncio.sleep(0.1)
+        task.cancel()
+        await sink.async_flush()
+
+    print(
+        f"recorded {args.readings} readings of {args.keys} keys"
+        f" in {record_time * 1000:.0f} ms"
+        f" ({record_time / args.readings * 1e6:.2f} us each)"
+    )
+    print(
+        f"received {influx.lines} lines in {influx.requests} requests, {sink.as_dict()}"
+    )
+    _report("write latency", latencies)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=100_000)
+    parser.add_argument("--keys", type=int, default=40)
+    parser.add_argument("--outage", type=float, default=0.0)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare the JSON paths used to decode /ivp/meters/readings payloads.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_json [--number 20000]
+"""
+
+# ruff: noqa: T201
+
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from custom_components.envoystream.decode import DecodePlan
+
+PAYLOADS = Path(__file__).parent / "payloads"
+
+
+def _load_plan() -> DecodePlan:
+    """Compile the decode plan of the recorded meters."""
+    meters = json.loads((PAYLOADS / "meters_three_phase.json").read_bytes())
+    return DecodePlan(
+        {meter["eid"]: meter["measurementType"] for meter in meters},
+        {meter["eid"]: meter["phaseCount"] for meter in meters},
+    )
+
+
+def _paths() -> dict[str, Callable[[bytes], Any]]:
+    """Return the JSON decoders to compare, by name."""
+    paths: dict[str, Callable[[bytes], Any]] = {
+        # What resp.json(content_type=None) does
+        "str + json": lambda body: json.loads(body.decode("utf-8")),
+        "bytes + json": json.loads,
+    }
+    try:
+        import orjson
+    except ImportError:
+        print("orjson is not installed, skipping it")
+    else:
+        paths["bytes + orjson"] = orjson.loads
+    return paths
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    body = (PAYLOADS / "readings_three_phase.json").read_bytes()
+    plan = _load_plan()
+
+    print(f"payload: {len(body)} bytes, {len(plan.keys)} keys, {args.number} runs")
+    for name, loads in _paths().items():
+        parse = timeit.timeit(lambda loads=loads: loads(body), number=args.number)
+        full = timeit.timeit(
+            lambda loads=loads: plan.decode_readings(loads(body)), number=args.number
+        )
+        print(
+            f"{name:>16}: parse {parse / args.number * 1e6:7.2f} us"
+            f"  parse+decode {full / args.number * 1e6:7.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""End-to-end performance benchmarks of EnvoyReader against the fake Envoy.
+
+Measures polls per second, get_datas latency percentiles, allocations per
+decode, stream frame delivery latency and, when the Home Assistant test
+helpers are installed, the latency from a stream frame to a sensor state
+write. Run from the repository root:
+
+    python -m benchmarks.bench_reader [--seconds 10] [--latency 0.05]
+"""
+
+# ruff: noqa: T201
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from typing import Any
+
+import aiohttp
+
+from custom_components.envoystream.envoy_reader import EnvoyReader
+
+from .fake_envoy import FakeEnvoy
+from .fake_envoy import FakeEnvoyConfig
+
+
+def _report(name: str, samples: list[float]) -> None:
+    """Print the percentiles of latency samples in milliseconds."""
+    if len(samples) < 2:
+        print(f"{name}: not enough samples ({len(samples)})")
+        return
+    percentiles = statistics.quantiles(samples, n=100)
+    print(
+        f"{name}: n={len(samples)}"
+        f" p50={percentiles[49] * 1000:.2f} ms"
+        f" p99={percentiles[98] * 1000:.2f} ms"
+        f" max={max(samples) * 1000:.2f} ms"
+    )
+
+
+async def bench_polls(
+    envoy: FakeEnvoy, session: aiohttp.ClientSession, seconds: float
+) -> None:
+    """Poll get_datas back to back and report rate and latency."""
+    reader = EnvoyReader(envoy.host, enlighten_token=envoy.token)
+
+    latencies: list[float] = []
+    failures = 0
+    end = time.monotonic() + seconds
+    while (start := time.monotonic()) < end:
+        try:
+            await reader.get_datas(session)
+        except (aiohttp.ClientError, ValueError):
+            failures += 1
+            continue
+        latencies.append(time.monotonic() - start)
+
+    print(f"polls: {len(latencies) / seconds:.1f}/s, {failures} failed")
+    _report("get_datas latency", latencies)
+
+
+async def bench_allocations(
+    envoy: FakeEnvoy, session: aiohttp.ClientSession, polls: int
+) -> None:
+    """Report the memory blocks retained by each decode of a readings payload."""
+    reader = EnvoyReader(envoy.host, enlighten_token=envoy.token)
+    await reader.get_meters(session)
+    async with session.get(
+        f"https://{envoy.host}/ivp/meters/readings",
+        headers={"Authorization": f"Bearer {envoy.token}"},
+    ) as resp:
+        readings = await resp.json()
+    plan = reader._plan  # pylint: disable=protected-access
+    assert plan is not None
+
+    results: list[Any] = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(polls):
+        results.append(plan.decode_readings(readings))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    print(
+        f"decode allocations: {blocks / polls:.1f} blocks,"
+        f" {size / polls:.0f} bytes per poll"
+    )
+
+
+async def bench_stream(
+    envoy: FakeEnvoy, session: aiohttp.ClientSession, seconds: float
+) -> None:
+    """Report the delay between a frame being sent and decoded."""
+    reader = EnvoyReader(envoy.host, enlighten_token=envoy.token)
+
+    latencies: list[float] = []
+
+    async def consume() -> None:
+        async for _ in reader.stream_datas(session):
+            if envoy.last_frame_time is not None:
+                latencies.append(time.monotonic() - envoy.last_frame_time)
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    _report("stream frame to data latency", latencies)
+
+
+async def bench_state_writes(envoy: FakeEnvoy, seconds: float) -> None:
+    """Report the delay between a stream frame and the first state write.
+
+    Runs the integration in a test Home Assistant instance, so it needs the
+    pytest-homeassistant-custom-component development dependency.
+    """
+    try:
+        from homeassistant import loader
+        from homeassistant.const import CONF_HOST
+        from homeassistant.const import CONF_TOKEN
+        from homeassistant.const import EVENT_STATE_CHANGED
+        from homeassistant.core import Event
+        from homeassistant.core import callback
+        from pytest_homeassistant_custom_component.common import MockConfigEntry
+        from pytest_homeassistant_custom_component.common import (
+            async_test_home_assistant,
+        )
+    except ImportError:
+        print("state write latency: skipped, Home Assistant test helpers missing")
+        return
+
+    from custom_components.envoystream.const import CONF_DEADBAND_PERCENT
+    from custom_components.envoystream.const import CONF_DEADBAND_WATTS
+    from custom_components.envoystream.const import CONF_SERIAL_NUMBER
+    from custom_components.envoystream.const import CONF_STREAM
+    from custom_components.envoystream.const import DOMAIN
+
+    latencies: list[float] = []
+    seen_frame = 0
+
+    async with async_test_home_assistant() as hass:
+        hass.data.pop(loader.DATA_CUSTOM_COMPONENTS, None)
+        # The fake Envoy is not announced, skip the zeroconf dependency
+        hass.config.components.add("zeroconf")
+
+        @callback
+        def _state_changed(event: Event) -> None:
+            nonlocal seen_frame
+            if envoy.last_frame_time is None or envoy.frames == seen_frame:
+                return
+            seen_frame = envoy.frames
+            latencies.append(time.monotonic() - envoy.last_frame_time)
+
+        hass.bus.async_listen(EVENT_STATE_CHANGED, _state_changed)
+
+        entry = MockConfigEntry(
+            domain=DOMAIN,
+            data={
+                CONF_HOST: envoy.host,
+                CONF_TOKEN: envoy.token,
+                CONF_SERIAL_NUMBER: envoy.config.serial,
+            },
+            options={
+                CONF_STREAM: True,
+                CONF_DEADBAND_WATTS: 0.0,
+                CONF_DEADBAND_PERCENT: 0.0,
+            },
+        )
+        entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await asyncio.sleep(seconds)
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+
+    _report("stream frame to state write latency", latencies)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    config = FakeEnvoyConfig(
+        meter_count=args.meters,
+        phase_count=args.phases,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        stream_rate=args.stream_rate,
+    )
+    async with (
+        FakeEnvoy(config) as envoy,
+        aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session,
+    ):
+        print(
+            f"fake Envoy: {config.meter_count} meters, {config.phase_count} phases,"
+            f" latency {config.latency}+{config.jitter} s,"
+            f" error rate {config.error_rate}"
+        )
+        await bench_polls(envoy, session, args.seconds)
+        await bench_allocations(envoy, session, args.polls)
+        await bench_stream(envoy, session, args.seconds)
+        await bench_state_writes(envoy, args.seconds)
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--polls", type=int, default=1000)
+    parser.add_argument("--meters", type=int, default=2)
+    parser.add_argument("--phases", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream-rate", type=float, default=20.0)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Replay a capture of raw Envoy responses through EnvoyReader.get_datas.
+
+Reproduces a field incident offline, or benchmarks decoding on payloads of
+a real firmware. Run from the repository root:
+
+    python -m benchmarks.bench_replay envoystream_<serial>.capture.gz [--speed 0]
+
+Without a capture file, --record captures the fake Envoy first.
+"""
+
+# ruff: noqa: T201
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+from custom_components.envoystream.capture import CaptureWriter
+from custom_components.envoystream.capture import ReplaySource
+from custom_components.envoystream.envoy_reader import EnvoyReader
+
+from .bench_reader import _report
+from .fake_envoy import FakeEnvoy
+
+
+async def record(path: Path, polls: int) -> None:
+    """Capture polls of the fake Envoy."""
+    async with (
+        FakeEnvoy() as envoy,
+        aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session,
+    ):
+        reader = EnvoyReader(envoy.host, enlighten_token=envoy.token)
+        reader.capture = CaptureWriter(path)
+        reader.capture.start()
+        await reader.get_full_serial_number(session)
+        for _ in range(polls):
+            await reader.get_datas(session)
+        reader.capture.close()
+    print(f"captured {polls} polls to {path} ({path.stat().st_size} bytes)")
+
+
+async def replay(path: Path, speed: float) -> None:
+    """Replay a capture and report the get_datas latency."""
+    reader = EnvoyReader("replay.invalid")
+    reader.replay = ReplaySource(path, speed)
+
+    latencies: list[float] = []
+    keys = 0
+    start = time.monotonic()
+    async with aiohttp.ClientSession() as session:
+        while True:
+            poll_start = time.monotonic()
+            try:
+                data = await reader.get_datas(session)
+            except EOFError:
+                break
+            latencies.append(time.monotonic() - poll_start)
+            keys = len(data)
+
+    elapsed = time.monotonic() - start
+    print(f"replayed {len(latencies)} polls of {keys} keys in {elapsed:.2f} s")
+    _report("get_datas latency", latencies)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.capture is None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "fake.capture.gz"
+            await record(path, args.record)
+            await replay(path, args.speed)
+    else:
+        await replay(args.capture, args.speed)
+
+
+def main() -> None:
+    """Run the replay."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("capture", type=Path, nargs="?")
+    parser.add_argument(
+        "--speed", type=float, default=0.0, help="1 for real time, 0 for no pacing"
+    )
+    parser.add_argument("--record", type=int, default=1000)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Local Envoy simulator serving the endpoints used by EnvoyReader.
+
+The simulator listens on 127.0.0.1 over HTTPS with a throwaway self-signed
+certificate. Meter and phase counts, response latency, jitter and the rate
+of failed requests are configurable, so benchmarks can reproduce slow or
+flaky Envoys.
+
+Run it standalone to point a development Home Assistant at it:
+
+    python -m benchmarks.fake_envoy --port 8443 --latency 0.2 --error-rate 0.05
+"""
+
+# ruff: noqa: T201
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime as dt
+import json
+import random
+import secrets
+import ssl
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import jwt
+from aiohttp import web
+
+# Measurement types in the order an Envoy reports them
+MEASUREMENT_TYPES = ("production", "net-consumption", "total-consumption")
+STREAM_PHASES = ("ph-a", "ph-b", "ph-c")
+FIRST_EID = 704643328
+
+
+@dataclass
+class FakeEnvoyConfig:
+    """Behaviour of the simulated Envoy."""
+
+    serial: str = "122300000001"
+    firmware: str = "D8.2.4225"
+    meter_count: int = 2
+    phase_count: int = 3
+    inverter_count: int = 24
+    # Seconds added to every response, plus a uniform random jitter
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Fraction of requests answered with a 503
+    error_rate: float = 0.0
+    stream: bool = True
+    stream_rate: float = 4.0
+    seed: int = 0
+
+
+def _self_signed_context(directory: Path) -> ssl.SSLContext:
+    """Create a server SSL context with a throwaway certificate."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "envoy.local")])
+    now = dt.datetime.now(dt.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - dt.timedelta(days=1))
+        .not_valid_after(now + dt.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+
+    cert_file = directory / "cert.pem"
+    key_file = directory / "key.pem"
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+class FakeEnvoy:
+    """Simulated Envoy, use as an async context manager."""
+
+    def __init__(self, config: FakeEnvoyConfig | None = None, port: int = 0) -> None:
+        """Init the simulator."""
+        self.config = config or FakeEnvoyConfig()
+        self.port = port
+        self.token = jwt.encode(
+            {"exp": int(time.time()) + 86400, "enphaseUser": "owner"},
+            "fake-envoy-signing-key-not-verified-by-the-reader",
+            algorithm="HS256",
+        )
+        self.requests: dict[str, int] = {}
+        # Session cookies handed out by /auth/check_jwt
+        self.sessions: set[str] = set()
+        self.errors = 0
+        # Monotonic time and number of the last stream frame sent
+        self.last_frame_time: float | None = None
+        self.frames = 0
+
+        self._random = random.Random(self.config.seed)
+        self._eids = [FIRST_EID + i * 256 for i in range(self.config.meter_count)]
+        self._power = [
+            [self._random.uniform(0, 1500) for _ in range(self.config.phase_count)]
+            for _ in self._eids
+        ]
+        self._energy = [
+            [self._random.uniform(1e6, 1e7) for _ in range(self.config.phase_count)]
+            for _ in self._eids
+        ]
+        self._runner: web.AppRunner | None = None
+        self._tempdir = tempfile.TemporaryDirectory()
+
+    @property
+    def host(self) -> str:
+        """Return the host to give to EnvoyReader."""
+        return f"127.0.0.1:{self.port}"
+
+    async def __aenter__(self) -> FakeEnvoy:
+        """Start the simulator."""
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/info.json", self._info)
+        app.router.add_get("/auth/check_jwt", self._check_jwt)
+        app.router.add_get("/ivp/meters", self._meters)
+        app.router.add_get("/ivp/meters/readings", self._readings)
+        app.router.add_get("/stream/meter", self._stream)
+        app.router.add_get("/api/v1/production", self._production)
+        app.router.add_get("/api/v1/production/inverters", self._inverters)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(
+            self._runner,
+            "127.0.0.1",
+            self.port,
+            ssl_context=_self_signed_context(Path(self._tempdir.name)),
+        )
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        """Stop the simulator."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+        self._tempdir.cleanup()
+
+    @web.middleware
+    async def _middleware(
+        self, request: web.Request, handler: Any
+    ) -> web.StreamResponse:
+        """Count requests, check the token, add latency and errors."""
+        self.requests[request.path] = self.requests.get(request.path, 0) + 1
+
+        if (
+            request.headers.get("Authorization") != f"Bearer {self.token}"
+            and request.cookies.get("sessionId") not in self.sessions
+        ):
+            raise web.HTTPUnauthorized()
+
+        if delay := self.config.latency + self._random.uniform(0, self.config.jitter):
+            await asyncio.sleep(delay)
+
+        if self._random.random() < self.config.error_rate:
+            self.errors += 1
+            raise web.HTTPServiceUnavailable()
+
+        return await handler(request)
+
+    def _step(self) -> None:
+        """Move every phase power on a random walk and integrate energy."""
+        for power, energy in zip(self._power, self._energy, strict=True):
+            for phase in range(self.config.phase_count):
+                power[phase] = max(0.0, power[phase] + self._random.gauss(0, 25))
+                energy[phase] += power[phase] / 3600
+
+    def _channel(self, eid: int, power: float, energy: float) -> dict[str, Any]:
+        """Build one reading or channel of /ivp/meters/readings."""
+        voltage = self._random.uniform(228, 236)
+        return {
+            "eid": eid,
+            "timestamp": int(time.time()),
+            "actEnergyDlvd": round(energy, 3),
+            "actEnergyRcvd": round(energy / 20, 3),
+            "apparentEnergy": round(energy * 1.05, 3),
+            "reactEnergyLagg": round(energy / 30, 3),
+            "reactEnergyLead": round(energy / 300, 3),
+            "instantaneousDemand": round(power, 3),
+            "activePower": round(power, 3),
+            "apparentPower": round(power * 1.04, 3),
+            "reactivePower": round(self._random.uniform(-90, 90), 3),
+            "pwrFactor": round(self._random.uniform(0.85, 1.0), 3),
+            "voltage": round(voltage, 3),
+            "current": round(power / voltage, 3),
+            "freq": 50.0,
+        }
+
+    async def _check_jwt(self, request: web.Request) -> web.Response:
+        """Exchange the token for a session cookie."""
+        if request.headers.get("Authorization") != f"Bearer {self.token}":
+            raise web.HTTPUnauthorized()
+        session_id = secrets.token_hex(16)
+        self.sessions.add(session_id)
+        response = web.Response(
+            text="<!DOCTYPE html><h2>Valid token.</h2>", content_type="text/html"
+        )
+        response.set_cookie("sessionId", session_id, secure=True, httponly=True)
+        return response
+
+    async def _info(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=(
+                "<?xml version='1.0' encoding='UTF-8'?><envoy_info><device>"
+                f"<sn>{self.config.serial}</sn>"
+                f"<software>{self.config.firmware}</software>"
+                "</device></envoy_info>"
+            ),
+            content_type="application/xml",
+        )
+
+    async def _meters(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            [
+                {
+                    "eid": eid,
+                    "state": "enabled",
+                    "measurementType": MEASUREMENT_TYPES[i % len(MEASUREMENT_TYPES)],
+                    "phaseMode": "three" if self.config.phase_count == 3 else "split",
+                    "phaseCount": self.config.phase_count,
+                    "meteringStatus": "normal",
+                    "statusFlags": [],
+                }
+                for i, eid in enumerate(self._eids)
+            ]
+        )
+
+    async def _readings(self, request: web.Request) -> web.Response:
+        self._step()
+        readings = []
+        for eid, power, energy in zip(
+            self._eids, self._power, self._energy, strict=True
+        ):
+            reading = self._channel(eid, sum(power), sum(energy))
+            reading["channels"] = [
+                self._channel(eid + 1 + phase, power[phase], energy[phase])
+                for phase in range(self.config.phase_count)
+            ]
+            readings.append(reading)
+        return web.json_response(readings)
+
+    async def _production(self, request: web.Request) -> web.Response:
+        lifetime = sum(self._energy[0])
+        return web.json_response(
+            {
+                "wattHoursToday": int(lifetime % 20000),
+                "wattHoursSevenDays": int(lifetime % 140000),
+                "wattHoursLifetime": int(lifetime),
+                "wattsNow": int(sum(self._power[0])),
+            }
+        )
+
+    async def _inverters(self, request: web.Request) -> web.Response:
+        # Microinverters report every 5 minutes
+        last_report = int(time.time()) // 300 * 300
+        return web.json_response(
+            [
+                {
+                    "serialNumber": f"4820{index:08d}",
+                    "lastReportDate": last_report,
+                    "devType": 1,
+                    "lastReportWatts": int(self._random.uniform(0, 300)),
+                    "maxReportWatts": 300,
+                }
+                for index in range(self.config.inverter_count)
+            ]
+        )
+
+    async def _stream(self, request: web.Request) -> web.StreamResponse:
+        if not self.config.stream:
+            raise web.HTTPNotFound()
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        # Stream until the client goes away
+        with contextlib.suppress(ConnectionResetError):
+            while True:
+                self._step()
+                frame = {
+                    MEASUREMENT_TYPES[i % len(MEASUREMENT_TYPES)]: {
+                        phase: {
+                            "p": round(power[n], 3),
+                            "q": 0.0,
+                            "s": round(power[n] * 1.04, 3),
+                            "v": 230.0,
+                            "i": round(power[n] / 230, 3),
+                            "pf": 1.0,
+                            "f": 50.0,
+                        }
+                        for n, phase in enumerate(
+                            STREAM_PHASES[: self.config.phase_count]
+                        )
+                    }
+                    for i, power in enumerate(self._power)
+                }
+                await response.write(
+                    b"data: " + json.dumps(frame).encode() + b"\r\n\r\n"
+                )
+                self.last_frame_time = time.monotonic()
+                self.frames += 1
+                await asyncio.sleep(1 / self.config.stream_rate)
+        return response
+
+
+async def _serve(config: FakeEnvoyConfig, port: int) -> None:
+    async with FakeEnvoy(config, port) as envoy:
+        print(f"Fake Envoy {config.serial} on https://{envoy.host}")
+        print(f"Token: {envoy.token}")
+        await asyncio.Event().wait()
+
+
+def main() -> None:
+    """Serve a fake Envoy until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--meters", type=int, default=2)
+    parser.add_argument("--phases", type=int, default=3)
+    parser.add_argument("--inverters", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-stream", action="store_true")
+    args = parser.parse_args()
+
+    config = FakeEnvoyConfig(
+        meter_count=args.meters,
+        phase_count=args.phases,
+        inverter_count=args.inverters,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        stream=not args.no_stream,
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(_serve(config, args.port))
+
+
+if __name__ == "__main__":
+    main()
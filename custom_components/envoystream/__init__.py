@@ -1,14 +1,24 @@
-"""Envoystream custom integration."""
+"""Envoystream custom integration.
+
+Home Assistant is only imported once the integration is set up, so the
+reader and the headless collector (python -m custom_components.envoystream)
+run without it.
+"""
 
 from __future__ import annotations
 
 import asyncio
-
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from typing import TYPE_CHECKING
 
 from .const import DOMAIN
-from .coordinator import EnvoyDataUpdateCoordinator
+
+if TYPE_CHECKING:
+    from homeassistant.config_entries import ConfigEntry
+    from homeassistant.core import HomeAssistant
+
+    from .coordinator import EnvoyDataUpdateCoordinator
+
+# pylint: disable=import-outside-toplevel
 
 PLATFORMS = ["sensor"]
 
@@ -21,28 +31,58 @@ async def _async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
 # pylint: disable=unused-argument
 async def async_setup(hass: HomeAssistant, config: ConfigEntry):
     """Set up this integration using YAML is not supported."""
+    from .websocket import async_setup_websocket
+
+    async_setup_websocket(hass)
     return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up IRegul from a config entry."""
+    from homeassistant.exceptions import ConfigEntryNotReady
+    from homeassistant.helpers.event import async_track_time_interval
+
+    from .coordinator import EnvoyDataUpdateCoordinator
+    from .coordinator import TOPOLOGY_CHECK_INTERVAL
+    from .scheduler import async_get_scheduler
 
     entry.async_on_unload(entry.add_update_listener(_async_reload_entry))
 
     coordinator = EnvoyDataUpdateCoordinator(hass, entry=entry)
 
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        await coordinator.async_config_entry_first_refresh()
+    except ConfigEntryNotReady:
+        coordinator.async_cancel_subscriptions()
+        await coordinator.async_stop_capture()
+        raise
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator
+    entry.async_on_unload(async_get_scheduler(hass).async_add(coordinator))
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    entry.async_create_background_task(
+        hass, coordinator.async_check_topology(), f"{DOMAIN} topology check"
+    )
+    entry.async_on_unload(
+        async_track_time_interval(
+            hass, coordinator.async_check_topology_interval, TOPOLOGY_CHECK_INTERVAL
+        )
+    )
+
+    coordinator.async_start_export()
+    if coordinator.stream:
+        coordinator.async_start_stream()
+
     return True
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
+    from .session import async_close_envoy_session
+
     unload_ok = all(
         await asyncio.gather(
             *[
@@ -52,6 +92,22 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         )
     )
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator: EnvoyDataUpdateCoordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator.async_cancel_subscriptions()
+        await coordinator.async_stop_capture()
+        await coordinator.async_stop_export()
+        await async_close_envoy_session(hass, coordinator.envoy_reader.host)
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the cached topology of a deleted config entry."""
+    from homeassistant.helpers.storage import Store
+
+    from .coordinator import STORAGE_VERSION
+
+    store: Store[dict[str, object]] = Store(
+        hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}"
+    )
+    await store.async_remove()
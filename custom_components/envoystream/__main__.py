@@ -0,0 +1,5 @@
+"""Run the headless collector."""
+
+from .collector import main
+
+main()
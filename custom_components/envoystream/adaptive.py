@@ -0,0 +1,61 @@
+"""Adaptive poll interval following the variance of the readings."""
+
+from __future__ import annotations
+
+import statistics
+from collections import deque
+from collections.abc import Mapping
+
+# Site level power values watched to decide whether readings are stable
+SIGNAL_KEYS = ("production", "net-consumption", "total_consumption")
+# Number of recent polls the variance is computed on
+WINDOW = 5
+# Readings are stable below this standard deviation, in watts
+STABLE_STDDEV = 15.0
+# A reading this far from the recent mean, in watts, snaps back to the floor
+CHANGE_THRESHOLD = 100.0
+# Growth factor of the interval for each stable poll
+STRETCH_FACTOR = 1.5
+
+
+class AdaptiveInterval:
+    """Poll interval stretching while readings are stable.
+
+    The interval grows from the floor to the ceiling while the recent
+    readings barely move, and snaps back to the floor on the first
+    significant change.
+    """
+
+    def __init__(self, floor: float, ceiling: float) -> None:
+        """Init the interval at its floor."""
+        self.floor = floor
+        self.ceiling = max(floor, ceiling)
+        self.interval = floor
+        self._samples: dict[str, deque[float]] = {
+            key: deque(maxlen=WINDOW) for key in SIGNAL_KEYS
+        }
+
+    def update(self, data: Mapping[str, float]) -> float:
+        """Add a poll result and return the interval until the next poll."""
+        stable = seen = False
+        for key, samples in self._samples.items():
+            if (value := data.get(key)) is None:
+                continue
+            if not seen:
+                stable = seen = True
+
+            if samples and abs(value - statistics.fmean(samples)) > CHANGE_THRESHOLD:
+                # Restart the window so the new level has to prove stable
+                for window in self._samples.values():
+                    window.clear()
+                samples.append(value)
+                self.interval = self.floor
+                return self.interval
+
+            samples.append(value)
+            if len(samples) < WINDOW or statistics.pstdev(samples) > STABLE_STDDEV:
+                stable = False
+
+        if stable:
+            self.interval = min(self.interval * STRETCH_FACTOR, self.ceiling)
+        return self.interval
@@ -0,0 +1,67 @@
+"""Circuit breaker keeping requests away from a failing Envoy."""
+
+from __future__ import annotations
+
+import time
+
+# Consecutive failures opening the circuit
+FAILURE_THRESHOLD = 3
+# Time the circuit stays open after it opens, doubled on each failed probe
+BACKOFF = 5.0
+MAX_BACKOFF = 300.0
+
+
+class CircuitBreaker:
+    """Fail fast while the Envoy keeps failing, then probe it back.
+
+    After FAILURE_THRESHOLD consecutive failures the circuit opens and
+    requests are refused for the backoff time. The first request after it
+    is a probe: its success closes the circuit, its failure opens it again
+    for twice as long.
+    """
+
+    __slots__ = ("_failures", "_opened_until", "_probing", "backoff")
+
+    def __init__(self) -> None:
+        """Init a closed circuit."""
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probing = False
+        self.backoff = BACKOFF
+
+    @property
+    def is_open(self) -> bool:
+        """Return True while failures are being backed off."""
+        return self._failures >= FAILURE_THRESHOLD
+
+    def allow(self) -> bool:
+        """Return True when a request may be sent now."""
+        if not self.is_open:
+            return True
+        if self._probing or time.monotonic() < self._opened_until:
+            return False
+        self._probing = True
+        return True
+
+    def retry_in(self) -> float:
+        """Return the seconds until the next probe is allowed."""
+        return max(self._opened_until - time.monotonic(), 0.0)
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+        self._failures = 0
+        self._probing = False
+        self.backoff = BACKOFF
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit or extending its backoff."""
+        self._failures += 1
+        if self._probing:
+            self._probing = False
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+        if self.is_open:
+            self._opened_until = time.monotonic() + self.backoff
+
+    def release(self) -> None:
+        """Give back a probe that ended without telling anything."""
+        self._probing = False
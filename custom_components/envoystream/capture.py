@@ -0,0 +1,233 @@
+"""Capture raw Envoy responses to a file and replay them.
+
+A capture file is a gzip stream of length-prefixed records. Each record is
+a RECORD_HEADER (wall clock time, request latency, endpoint length), the
+endpoint path and the raw response body. Records are only ever appended,
+a capture cut short by a crash is read up to its last complete record.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from .const import LOGGER
+
+# Endpoints captured, the meters are needed to replay the readings
+CAPTURE_ENDPOINTS = frozenset({"/info.json", "/ivp/meters", "/ivp/meters/readings"})
+
+RECORD_LENGTH = struct.Struct(">I")
+# Wall clock time, latency in seconds, endpoint length
+RECORD_HEADER = struct.Struct(">ddH")
+
+# Size of the current file before it is rotated, in compressed bytes
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+# Records waiting for the writer thread, more are dropped
+MAX_PENDING = 1000
+# Seconds between two flushes of the compressed stream
+FLUSH_INTERVAL = 5.0
+# Seconds close waits for the writer thread
+CLOSE_TIMEOUT = 10.0
+
+
+@dataclass(frozen=True, slots=True)
+class CaptureRecord:
+    """One captured response."""
+
+    time: float
+    latency: float
+    endpoint: str
+    body: bytes
+
+
+class CaptureWriter:
+    """Append responses to a capture file from a dedicated thread.
+
+    record only queues the response, compression and file writes never run
+    on the event loop. The file is rotated to path.1 ... path.N once it
+    reaches max_bytes.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+    ) -> None:
+        """Init the writer, start must be called before recording."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue: queue.Queue[CaptureRecord | None] = queue.Queue(MAX_PENDING)
+        self._thread = threading.Thread(
+            target=self._run, name=f"envoystream capture {path.name}", daemon=True
+        )
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        self._thread.start()
+
+    def record(self, endpoint: str, latency: float, body: bytes) -> None:
+        """Queue a response, dropping it when the writer falls behind."""
+        try:
+            self._queue.put_nowait(CaptureRecord(time.time(), latency, endpoint, body))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """Write the queued records and stop the thread, blocking.
+
+        Gives up after CLOSE_TIMEOUT when the thread died or stalls, so an
+        unload never hangs on a broken capture.
+        """
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=CLOSE_TIMEOUT)
+        except queue.Full:
+            LOGGER.warning("Capture to %s stalled, records lost", self.path)
+            return
+        self._thread.join(CLOSE_TIMEOUT)
+
+    def _run(self) -> None:
+        """Write queued records until close."""
+        try:
+            raw = self.path.open("ab")
+        except OSError:
+            LOGGER.exception("Capture to %s failed", self.path)
+            return
+        stream = gzip.GzipFile(fileobj=raw, mode="ab")
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    record = self._queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    pass
+                else:
+                    if record is None:
+                        break
+                    self._write(stream, record)
+
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    stream.flush()
+                    last_flush = time.monotonic()
+                    if raw.tell() >= self.max_bytes:
+                        stream.close()
+                        raw.close()
+                        self._rotate()
+                        raw = self.path.open("ab")
+                        stream = gzip.GzipFile(fileobj=raw, mode="ab")
+        except OSError:
+            LOGGER.exception("Capture to %s failed", self.path)
+        finally:
+            stream.close()
+            raw.close()
+
+    @staticmethod
+    def _write(stream: gzip.GzipFile, record: CaptureRecord) -> None:
+        """Append a record to the compressed stream."""
+        endpoint = record.endpoint.encode()
+        header = RECORD_HEADER.pack(record.time, record.latency, len(endpoint))
+        stream.write(RECORD_LENGTH.pack(len(header) + len(endpoint) + len(record.body)))
+        stream.write(header)
+        stream.write(endpoint)
+        stream.write(record.body)
+
+    def _rotate(self) -> None:
+        """Shift path.N-1 to path.N, down to path to path.1."""
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+
+def read_capture(path: Path) -> Iterator[CaptureRecord]:
+    """Yield the records of a capture file, oldest first."""
+    with gzip.open(path, "rb") as stream:
+        while True:
+            try:
+                if len(prefix := stream.read(RECORD_LENGTH.size)) < RECORD_LENGTH.size:
+                    return
+                (length,) = RECORD_LENGTH.unpack(prefix)
+                if len(data := stream.read(length)) < length:
+                    return
+            except (EOFError, zlib.error):
+                # Capture cut short, the records before are complete
+                return
+
+            record_time, latency, endpoint_length = RECORD_HEADER.unpack_from(data)
+            offset = RECORD_HEADER.size
+            yield CaptureRecord(
+                record_time,
+                latency,
+                data[offset : offset + endpoint_length].decode(),
+                data[offset + endpoint_length :],
+            )
+
+
+class ReplaySource:
+    """Serve captured responses in place of the Envoy.
+
+    Each request for an endpoint gets the next captured body of that
+    endpoint. Readings are paced like the capture, divided by speed, a
+    speed of 0 serves them as fast as they are asked for.
+    """
+
+    def __init__(self, path: Path, speed: float = 1.0) -> None:
+        """Load the capture file."""
+        self.speed = speed
+        self._records: dict[str, list[CaptureRecord]] = {}
+        for record in read_capture(path):
+            self._records.setdefault(record.endpoint, []).append(record)
+        self._positions = dict.fromkeys(self._records, 0)
+        self._started: tuple[float, float] | None = None
+
+    @property
+    def exhausted(self) -> bool:
+        """Return True once every captured reading was served."""
+        readings = self._records.get("/ivp/meters/readings", ())
+        return self._positions.get("/ivp/meters/readings", 0) >= len(readings)
+
+    async def async_get(self, endpoint: str) -> bytes:
+        """Return the next captured body of an endpoint.
+
+        Endpoints captured once, like the meters, keep serving their last
+        body. Raises EOFError when no body was captured for the endpoint or
+        the readings are exhausted.
+        """
+        if not (records := self._records.get(endpoint)):
+            raise EOFError(f"No capture of {endpoint}")
+
+        position = self._positions[endpoint]
+        if position >= len(records):
+            if endpoint == "/ivp/meters/readings":
+                raise EOFError("Capture replayed")
+            position = len(records) - 1
+        else:
+            self._positions[endpoint] = position + 1
+        record = records[position]
+
+        if endpoint == "/ivp/meters/readings" and self.speed > 0:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = (now, record.time)
+            else:
+                due = self._started[0] + (record.time - self._started[1]) / self.speed
+                if due > now:
+                    await asyncio.sleep(due - now)
+            await asyncio.sleep(record.latency / self.speed)
+
+        return record.body
@@ -0,0 +1,228 @@
+"""Headless collector writing the readings of Envoys without Home Assistant.
+
+Polls, or follows the meter stream of, one or more Envoys and writes every
+sample as a JSON line or an InfluxDB line protocol line:
+
+    python -m custom_components.envoystream 192.168.1.10 --token "$TOKEN"
+    python -m custom_components.envoystream 10.0.0.2=<token> 10.0.0.3=<token> \
+        --stream --format line --output envoys.lp
+
+With --replay, the readings of a capture file are decoded and written
+instead, to reproduce a field incident offline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import ssl
+import sys
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import TextIO
+
+import aiohttp
+
+from .capture import ReplaySource
+from .const import LOGGER
+from .envoy_reader import EnvoyReader
+from .envoy_reader import RequestSupersededError
+from .envoy_reader import STREAM_READINGS_INTERVAL
+from .envoy_reader import STREAM_RETRY_DELAY
+from .envoy_reader import StreamNotSupportedError
+from .export import format_line
+
+
+class SampleWriter:
+    """Write samples as lines to a text stream."""
+
+    def __init__(self, output: TextIO, line_format: str) -> None:
+        """Init the writer, line_format is json or line."""
+        self._output = output
+        self._line_format = line_format
+
+    def write(self, serial: str, data: Mapping[str, float]) -> None:
+        """Write a sample, timestamped now."""
+        if self._line_format == "line":
+            if (line := format_line(f"serial={serial}", data, time.time_ns())) is None:
+                return
+        else:
+            line = json.dumps(
+                {"time": time.time(), "serial": serial, "values": dict(data)}
+            )
+        self._output.write(line + "\n")
+        self._output.flush()
+
+
+def _create_session() -> aiohttp.ClientSession:
+    """Return a session accepting the self-signed certificate of the Envoy."""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            ssl=context, limit_per_host=2, keepalive_timeout=60
+        )
+    )
+
+
+async def _async_poll(
+    reader: EnvoyReader,
+    session: aiohttp.ClientSession,
+    writer: SampleWriter | None,
+    interval: float,
+) -> None:
+    """Poll the readings every interval, writing them unless writer is None."""
+    next_poll = time.monotonic()
+    while True:
+        try:
+            data = await reader.get_datas(session)
+        except (
+            aiohttp.ClientError,
+            TimeoutError,
+            ValueError,
+            RequestSupersededError,
+        ) as err:
+            LOGGER.warning("Envoy %s poll failed: %s", reader.host, err)
+        else:
+            if writer is not None:
+                assert reader.enlighten_serial_num is not None
+                writer.write(reader.enlighten_serial_num, data)
+
+        # Keep the polls on their grid, skipping those a slow request missed
+        next_poll += interval
+        now = time.monotonic()
+        if next_poll < now:
+            next_poll = now + interval - (now - next_poll) % interval
+        await asyncio.sleep(next_poll - now)
+
+
+async def _async_stream(
+    reader: EnvoyReader, session: aiohttp.ClientSession, writer: SampleWriter
+) -> bool:
+    """Write the stream frames, return False when the Envoy has no stream."""
+    assert reader.enlighten_serial_num is not None
+    readings = asyncio.create_task(
+        _async_poll(reader, session, None, STREAM_READINGS_INTERVAL)
+    )
+    try:
+        async for data in reader.stream_datas(session):
+            writer.write(reader.enlighten_serial_num, data)
+    except StreamNotSupportedError as err:
+        LOGGER.info("%s, polling instead", err)
+        return False
+    except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+        LOGGER.warning("Envoy %s stream ended: %s", reader.host, err)
+    finally:
+        readings.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await readings
+    return True
+
+
+async def async_collect(
+    host: str, token: str, writer: SampleWriter, interval: float, stream: bool
+) -> None:
+    """Collect the samples of an Envoy until cancelled."""
+    reader = EnvoyReader(host, enlighten_token=token)
+    async with _create_session() as session:
+        while reader.enlighten_serial_num is None:
+            try:
+                await reader.get_full_serial_number(session)
+            except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+                LOGGER.warning("Envoy %s unreachable: %s", host, err)
+                await asyncio.sleep(STREAM_RETRY_DELAY)
+        LOGGER.info("Collecting Envoy %s (%s)", reader.enlighten_serial_num, host)
+
+        while stream:
+            stream = await _async_stream(reader, session, writer)
+            if stream:
+                await asyncio.sleep(STREAM_RETRY_DELAY)
+        await _async_poll(reader, session, writer, interval)
+
+
+async def async_replay(path: Path, writer: SampleWriter, speed: float) -> None:
+    """Write the readings of a capture file until it is exhausted."""
+    reader = EnvoyReader("replay.invalid")
+    reader.replay = ReplaySource(path, speed)
+    async with aiohttp.ClientSession() as session:
+        try:
+            serial, _ = await reader.get_full_serial_number(session)
+        except EOFError:
+            serial = path.name
+        LOGGER.info("Replaying Envoy %s from %s", serial, path)
+        while True:
+            try:
+                data = await reader.get_datas(session)
+            except EOFError:
+                return
+            writer.write(serial, data)
+
+
+def _parse_envoys(envoys: list[str], token: str | None) -> list[tuple[str, str]]:
+    """Return the host and token of HOST or HOST=TOKEN arguments."""
+    result = []
+    for envoy in envoys:
+        host, _, envoy_token = envoy.partition("=")
+        if not (envoy_token := envoy_token or token):
+            raise SystemExit(f"No token for {host}, use HOST=TOKEN or --token")
+        result.append((host, envoy_token))
+    return result
+
+
+async def _async_main(args: argparse.Namespace, output: TextIO) -> None:
+    writer = SampleWriter(output, args.format)
+    if args.replay:
+        await async_replay(Path(args.replay), writer, args.speed)
+        return
+    await asyncio.gather(
+        *(
+            async_collect(host, token, writer, args.interval, args.stream)
+            for host, token in _parse_envoys(args.envoy, args.token)
+        )
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the collector until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="python -m custom_components.envoystream",
+        description="Write the readings of Enphase Envoys as lines.",
+    )
+    parser.add_argument("envoy", nargs="*", help="HOST or HOST=TOKEN")
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("ENVOY_TOKEN"),
+        help="token of the Envoys given without one, defaults to $ENVOY_TOKEN",
+    )
+    parser.add_argument("--interval", type=float, default=2.0, help="poll seconds")
+    parser.add_argument("--stream", action="store_true", help="follow the meter stream")
+    parser.add_argument("--format", choices=("json", "line"), default="json")
+    parser.add_argument("--replay", help="capture file to write the readings of")
+    parser.add_argument(
+        "--speed", type=float, default=0.0, help="replay speed, 0 as fast as possible"
+    )
+    parser.add_argument("--output", help="file to append to, defaults to stdout")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.envoy and not args.replay:
+        parser.error("give an Envoy or --replay")
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        stream=sys.stderr,
+    )
+    with contextlib.ExitStack() as stack:
+        output = (
+            stack.enter_context(open(args.output, "a", encoding="utf-8"))  # noqa: SIM115
+            if args.output
+            else sys.stdout
+        )
+        with contextlib.suppress(KeyboardInterrupt):
+            asyncio.run(_async_main(args, output))
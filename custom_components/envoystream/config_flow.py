@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
+import asyncio
 from typing import Any
+from urllib.parse import urlsplit
 
 import aiohttp
 import voluptuous as vol
@@ -13,18 +15,54 @@ from homeassistant.const import CONF_NAME
 from homeassistant.const import CONF_TOKEN
 from homeassistant.core import callback
 from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import AbortFlow
 from homeassistant.exceptions import HomeAssistantError
-from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
 from jwt import InvalidTokenError
 
+from .const import CONF_CAPTURE
+from .const import CONF_DEADBAND_PERCENT
+from .const import CONF_DEADBAND_WATT_HOURS
+from .const import CONF_DEADBAND_WATTS
+from .const import CONF_EXPORT_TOKEN
+from .const import CONF_EXPORT_URL
+from .const import CONF_MAX_QUIET_INTERVAL
+from .const import CONF_MAX_UPDATE_INTERVAL
+from .const import CONF_QUALITY_FIELDS
+from .const import CONF_QUALITY_INTERVALS
 from .const import CONF_SERIAL_NUMBER
+from .const import CONF_STALE_BUDGET
+from .const import CONF_STREAM
 from .const import CONF_UPDATE_INTERVAL
+from .const import DEFAULT_CAPTURE
+from .const import DEFAULT_DEADBAND_PERCENT
+from .const import DEFAULT_DEADBAND_WATT_HOURS
+from .const import DEFAULT_DEADBAND_WATTS
+from .const import DEFAULT_MAX_QUIET_INTERVAL
+from .const import DEFAULT_MAX_UPDATE_INTERVAL
+from .const import DEFAULT_QUALITY_INTERVAL
+from .const import DEFAULT_STALE_BUDGET
+from .const import DEFAULT_STREAM
 from .const import DEFAULT_UPDATE_INTERVAL
 from .const import DOMAIN
 from .const import LOGGER
 from .envoy_reader import EnvoyReader
+from .envoy_reader import normalize_host
+from .session import async_close_envoy_session
+from .session import async_get_envoy_session
+from .session import async_store_validated_reader
 
 ENVOY = "Envoy"
+# Labels of the QUALITY_FIELDS of decode in the options
+QUALITY_FIELD_NAMES = {
+    "voltage": "Voltage",
+    "current": "Current",
+    "power_factor": "Power factor",
+    "reactive_power": "Reactive power",
+    "apparent_power": "Apparent power",
+    "frequency": "Frequency",
+}
 TOKEN_URL = "https://entrez.enphaseenergy.com"
 
 
@@ -147,7 +185,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Set the unique id by fetching it from the envoy."""
         serial = envoy_reader.enlighten_serial_num
         if serial is None:
-            session = async_create_clientsession(hass, verify_ssl=False)
+            session = async_get_envoy_session(hass, envoy_reader.host)
             serial, firmware_version = await envoy_reader.get_full_serial_number(
                 session
             )
@@ -159,6 +197,12 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             return True
         return False
 
+    async def _async_close_unused_session(self, host: str) -> None:
+        """Close the session the flow opened, unless an entry uses the host."""
+        host = normalize_host(host)
+        if host not in {normalize_host(known) for known in self._async_current_hosts()}:
+            await async_close_envoy_session(self.hass, host)
+
     async def async_step_user(self, user_input: dict[str, Any] | None = None):
         """Handle the initial step."""
         errors: dict[str, str] = {}
@@ -185,6 +229,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                         self.hass, envoy_reader
                     )
                 ):
+                    await self._async_close_unused_session(user_input[CONF_HOST])
                     errors["base"] = "cannot_connect"
                     return self.async_show_form(
                         step_id="user",
@@ -197,6 +242,9 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 data[CONF_NAME] = self._async_envoy_name()
 
                 if self._reauth_entry:
+                    async_store_validated_reader(
+                        self.hass, data[CONF_HOST], envoy_reader
+                    )
                     self.hass.config_entries.async_update_entry(
                         self._reauth_entry,
                         data=data,
@@ -204,10 +252,21 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     return self.async_abort(reason="reauth_successful")
 
                 if self.unique_id:
-                    self._abort_if_unique_id_configured({CONF_HOST: data[CONF_HOST]})
-
+                    try:
+                        self._abort_if_unique_id_configured(
+                            {CONF_HOST: data[CONF_HOST]}
+                        )
+                    except AbortFlow:
+                        await self._async_close_unused_session(data[CONF_HOST])
+                        raise
+
+                # The entry setup picks the warm reader up instead of
+                # requesting the meters and the serial number again
+                async_store_validated_reader(self.hass, data[CONF_HOST], envoy_reader)
                 return self.async_create_entry(title=data[CONF_NAME], data=data)
 
+            await self._async_close_unused_session(user_input[CONF_HOST])
+
         if self.unique_id:
             self.context["title_placeholders"] = {
                 CONF_SERIAL_NUMBER: self.unique_id,
@@ -223,21 +282,31 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     async def validate_input(
         self, hass: HomeAssistant, data: dict[str, Any]
     ) -> EnvoyReader:
-        """Validate the user input allows us to connect."""
-        envoy_reader = EnvoyReader(
-            data[CONF_HOST],
-            enlighten_token=data[CONF_TOKEN],
-        )
+        """Validate the user input allows us to connect.
 
+        The token is checked locally first, then the meters and the serial
+        number are requested together on the shared session of the host.
+        """
         try:
-            session = async_create_clientsession(hass, verify_ssl=False)
-            await envoy_reader.get_meters(session)
-            (
-                envoy_reader.enlighten_serial_num,
-                envoy_reader.firmware_version,
-            ) = await envoy_reader.get_full_serial_number(session)
-        except InvalidTokenError as err:
+            envoy_reader = EnvoyReader(
+                data[CONF_HOST],
+                enlighten_token=data[CONF_TOKEN],
+            )
+        except (InvalidTokenError, KeyError) as err:
+            LOGGER.debug("Invalid token: %s", err)
             raise InvalidAuth from err
+        if (
+            expiry := envoy_reader.token_expiration_date
+        ) is not None and expiry <= dt_util.utcnow():
+            LOGGER.debug("Token expired on %s", expiry)
+            raise InvalidAuth
+
+        try:
+            session = async_get_envoy_session(hass, envoy_reader.host)
+            await asyncio.gather(
+                envoy_reader.get_meters(session),
+                envoy_reader.get_full_serial_number(session),
+            )
         except aiohttp.ClientResponseError as err:
             if err.status == 401:
                 raise InvalidAuth from err
@@ -245,7 +314,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             LOGGER.debug("Validation error: %s", err)
 
             raise CannotConnect from err
-        except ValueError as err:
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
             LOGGER.debug("Validation error: %s", err)
             raise CannotConnect from err
 
@@ -258,12 +327,23 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return OptionsFlowHandler(config_entry)
 
 
+def _valid_export_url(url: str) -> bool:
+    """Return True for an empty, http(s) or mqtt export URL."""
+    if not url:
+        return True
+    parsed = urlsplit(url)
+    if parsed.scheme == "mqtt":
+        return bool(parsed.netloc or parsed.path.strip("/"))
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+
 class OptionsFlowHandler(config_entries.OptionsFlow):
     """Handle a option flow for iregul."""
 
     def __init__(self, config_entry: config_entries.ConfigEntry):
         """Initialize options flow."""
         self._config_entry = config_entry
+        self._options: dict[str, Any] = {}
 
     @staticmethod
     @callback
@@ -273,7 +353,12 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
     async def async_step_init(self, user_input: dict[str, Any] | None = None):
         """Handle options flow."""
-        if user_input is not None:
+        errors: dict[str, str] = {}
+        if user_input is not None and not _valid_export_url(
+            user_input.get(CONF_EXPORT_URL, "")
+        ):
+            errors[CONF_EXPORT_URL] = "invalid_export_url"
+        elif user_input is not None:
             self.hass.config_entries.async_update_entry(
                 self._config_entry,
                 data={
@@ -281,14 +366,51 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                     CONF_TOKEN: user_input[CONF_TOKEN],
                 },
             )
-            return self.async_create_entry(
-                title="",
-                data={CONF_UPDATE_INTERVAL: user_input[CONF_UPDATE_INTERVAL]},
-            )
+            self._options = {
+                CONF_UPDATE_INTERVAL: user_input[CONF_UPDATE_INTERVAL],
+                CONF_MAX_UPDATE_INTERVAL: user_input[CONF_MAX_UPDATE_INTERVAL],
+                CONF_STREAM: user_input[CONF_STREAM],
+                CONF_DEADBAND_WATTS: user_input[CONF_DEADBAND_WATTS],
+                CONF_DEADBAND_PERCENT: user_input[CONF_DEADBAND_PERCENT],
+                CONF_DEADBAND_WATT_HOURS: user_input[CONF_DEADBAND_WATT_HOURS],
+                CONF_MAX_QUIET_INTERVAL: user_input[CONF_MAX_QUIET_INTERVAL],
+                CONF_STALE_BUDGET: user_input[CONF_STALE_BUDGET],
+                CONF_CAPTURE: user_input[CONF_CAPTURE],
+                CONF_EXPORT_URL: user_input.get(CONF_EXPORT_URL, ""),
+                CONF_EXPORT_TOKEN: user_input.get(CONF_EXPORT_TOKEN, ""),
+                CONF_QUALITY_FIELDS: user_input.get(CONF_QUALITY_FIELDS, []),
+                CONF_QUALITY_INTERVALS: {},
+            }
+            if self._options[CONF_QUALITY_FIELDS]:
+                return await self.async_step_quality()
+            return self.async_create_entry(title="", data=self._options)
 
         scan_interval = self._config_entry.options.get(
             CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL
         )
+        max_scan_interval = self._config_entry.options.get(
+            CONF_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL
+        )
+        stream = self._config_entry.options.get(CONF_STREAM, DEFAULT_STREAM)
+        deadband_watts = self._config_entry.options.get(
+            CONF_DEADBAND_WATTS, DEFAULT_DEADBAND_WATTS
+        )
+        deadband_percent = self._config_entry.options.get(
+            CONF_DEADBAND_PERCENT, DEFAULT_DEADBAND_PERCENT
+        )
+        deadband_watt_hours = self._config_entry.options.get(
+            CONF_DEADBAND_WATT_HOURS, DEFAULT_DEADBAND_WATT_HOURS
+        )
+        max_quiet = self._config_entry.options.get(
+            CONF_MAX_QUIET_INTERVAL, DEFAULT_MAX_QUIET_INTERVAL
+        )
+        stale_budget = self._config_entry.options.get(
+            CONF_STALE_BUDGET, DEFAULT_STALE_BUDGET
+        )
+        capture = self._config_entry.options.get(CONF_CAPTURE, DEFAULT_CAPTURE)
+        export_url = self._config_entry.options.get(CONF_EXPORT_URL, "")
+        export_token = self._config_entry.options.get(CONF_EXPORT_TOKEN, "")
+        quality_fields = self._config_entry.options.get(CONF_QUALITY_FIELDS, [])
 
         opt_schema = vol.Schema(
             {
@@ -297,15 +419,54 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                     default=self._config_entry.data.get(CONF_TOKEN, ""),
                 ): str,
                 vol.Optional(CONF_UPDATE_INTERVAL, default=scan_interval): int,
+                vol.Optional(CONF_MAX_UPDATE_INTERVAL, default=max_scan_interval): int,
+                vol.Optional(CONF_STREAM, default=stream): bool,
+                vol.Optional(CONF_DEADBAND_WATTS, default=deadband_watts): vol.Coerce(
+                    float
+                ),
+                vol.Optional(
+                    CONF_DEADBAND_PERCENT, default=deadband_percent
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_DEADBAND_WATT_HOURS, default=deadband_watt_hours
+                ): vol.Coerce(float),
+                vol.Optional(CONF_MAX_QUIET_INTERVAL, default=max_quiet): int,
+                vol.Optional(CONF_STALE_BUDGET, default=stale_budget): int,
+                vol.Optional(CONF_CAPTURE, default=capture): bool,
+                vol.Optional(CONF_EXPORT_URL, default=export_url): str,
+                vol.Optional(CONF_EXPORT_TOKEN, default=export_token): str,
+                vol.Optional(
+                    CONF_QUALITY_FIELDS, default=quality_fields
+                ): cv.multi_select(QUALITY_FIELD_NAMES),
             }
         )
 
         return self.async_show_form(
             step_id="init",
             data_schema=opt_schema,
+            errors=errors,
             description_placeholders=self._async_description_placeholders(),
         )
 
+    async def async_step_quality(self, user_input: dict[str, Any] | None = None):
+        """Set the seconds between two samples of each power quality field."""
+        if user_input is not None:
+            self._options[CONF_QUALITY_INTERVALS] = user_input
+            return self.async_create_entry(title="", data=self._options)
+
+        intervals = self._config_entry.options.get(CONF_QUALITY_INTERVALS, {})
+        return self.async_show_form(
+            step_id="quality",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        field, default=intervals.get(field, DEFAULT_QUALITY_INTERVAL)
+                    ): vol.All(int, vol.Range(min=0))
+                    for field in self._options[CONF_QUALITY_FIELDS]
+                }
+            ),
+        )
+
     async def async_step_abort(self, user_input: dict[str, Any] | None = None):
         """Abort options flow."""
         return self.async_create_entry(title="", data=self._config_entry.options)
@@ -18,4 +18,41 @@ PLATFORMS = [SENSOR]
 CONF_UPDATE_INTERVAL = "upd_int"
 DEFAULT_UPDATE_INTERVAL = 2
 
+# Polling stretches up to this interval while readings are stable
+CONF_MAX_UPDATE_INTERVAL = "max_upd_int"
+DEFAULT_MAX_UPDATE_INTERVAL = 30
+
+CONF_STREAM = "stream"
+DEFAULT_STREAM = True
+
+# Power sensors only write their state when the value moves by more than
+# the deadband or when the quiet interval expires
+CONF_DEADBAND_WATTS = "deadband_w"
+DEFAULT_DEADBAND_WATTS = 5.0
+CONF_DEADBAND_WATT_HOURS = "deadband_wh"
+DEFAULT_DEADBAND_WATT_HOURS = 10.0
+CONF_DEADBAND_PERCENT = "deadband_pct"
+DEFAULT_DEADBAND_PERCENT = 1.0
+CONF_MAX_QUIET_INTERVAL = "max_quiet"
+DEFAULT_MAX_QUIET_INTERVAL = 60
+
+# Failed polls serve the last good sample for this many seconds before the
+# sensors go unavailable, 0 makes them unavailable on the first failure
+CONF_STALE_BUDGET = "stale_budget"
+DEFAULT_STALE_BUDGET = 30
+
+# Power quality fields of the readings exposed as sensors, and the seconds
+# between two samples of each
+CONF_QUALITY_FIELDS = "quality_fields"
+CONF_QUALITY_INTERVALS = "quality_intervals"
+DEFAULT_QUALITY_INTERVAL = 10
+
+CONF_CAPTURE = "capture"
+DEFAULT_CAPTURE = False
+
+# Every reading is also sent as InfluxDB line protocol, to an http(s) write
+# URL or to an mqtt://<topic> of the Home Assistant MQTT integration
+CONF_EXPORT_URL = "export_url"
+CONF_EXPORT_TOKEN = "export_token"
+
 CONF_SERIAL_NUMBER = "serial"
@@ -1,20 +1,113 @@
 """DataUpdateCoordinator for the IRegul integration."""
 
+import asyncio
+import contextlib
+import time
+from collections.abc import Callable
+from datetime import datetime
 from datetime import timedelta
+from functools import partial
+from pathlib import Path
+from typing import Any
 
+import aiohttp
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_HOST
 from homeassistant.const import CONF_TOKEN
+from homeassistant.core import CALLBACK_TYPE
+from homeassistant.core import callback
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.helpers.update_coordinator import UpdateFailed
 
+from .adaptive import AdaptiveInterval
+from .capture import CaptureWriter
+from .const import CONF_CAPTURE
+from .const import CONF_EXPORT_TOKEN
+from .const import CONF_EXPORT_URL
+from .const import CONF_MAX_UPDATE_INTERVAL
+from .const import CONF_QUALITY_FIELDS
+from .const import CONF_QUALITY_INTERVALS
 from .const import CONF_SERIAL_NUMBER
+from .const import CONF_STALE_BUDGET
+from .const import CONF_STREAM
 from .const import CONF_UPDATE_INTERVAL
+from .const import DEFAULT_CAPTURE
+from .const import DEFAULT_MAX_UPDATE_INTERVAL
+from .const import DEFAULT_QUALITY_INTERVAL
+from .const import DEFAULT_STALE_BUDGET
+from .const import DEFAULT_STREAM
 from .const import DEFAULT_UPDATE_INTERVAL
 from .const import DOMAIN
 from .const import LOGGER
+from .decode import EnvoyData
+from .decode import Quantity
+from .envoy_reader import ENDPOINTS
 from .envoy_reader import EnvoyReader
+from .envoy_reader import RequestSupersededError
+from .envoy_reader import STREAM_READ_TIMEOUT
+from .envoy_reader import STREAM_READINGS_INTERVAL
+from .envoy_reader import STREAM_RETRY_DELAY
+from .envoy_reader import StreamNotSupportedError
+from .export import ExportSender
+from .export import ExportSink
+from .export import HttpExportSender
+from .metrics import STATE_WRITE
+from .stats import RollingStatistics
+from .session import async_get_envoy_session
+from .session import async_pop_validated_reader
+from .subscription import SampleCallback
+from .subscription import Subscription
+
+# Meter topology and firmware kept between restarts
+STORAGE_VERSION = 1
+
+# The meter topology barely changes, check it hourly
+TOPOLOGY_CHECK_INTERVAL = timedelta(hours=1)
+# Shortest delay between two rediscoveries triggered by the readings, in
+# seconds, in case the readings and the meter list keep disagreeing
+REDISCOVERY_COOLDOWN = 300
+
+# Called with the added keys and their quantity, and the retired keys
+TopologyListener = Callable[[dict[str, Quantity], tuple[str, ...]], None]
+
+# Share of the poll interval a request may take, so a hung Envoy only costs
+# one poll, and the shortest deadline leaving room for a TLS handshake
+REQUEST_DEADLINE_FACTOR = 0.9
+MIN_REQUEST_DEADLINE = 2.0
+
+# Missed polls the last good sample outlives at least, so the stale budget
+# still covers a poll once the adaptive interval stretched past it
+MIN_STALE_POLLS = 2
+
+
+def _request_deadline(interval: timedelta) -> float:
+    """Return the request deadline for a poll interval, in seconds."""
+    return max(interval.total_seconds() * REQUEST_DEADLINE_FACTOR, MIN_REQUEST_DEADLINE)
+
+
+def _async_get_export_sender(hass: HomeAssistant, url: str, token: str) -> ExportSender:
+    """Return the sender of an http(s) or mqtt://<topic> export URL."""
+    if not url.startswith("mqtt://"):
+        return HttpExportSender(async_get_clientsession(hass), url, token)
+
+    topic = url.removeprefix("mqtt://").strip("/")
+
+    async def _async_publish(payload: bytes) -> None:
+        # pylint: disable=import-outside-toplevel
+        from homeassistant.components import mqtt
+
+        try:
+            await mqtt.async_publish(hass, topic, payload)
+        except HomeAssistantError as err:
+            raise ConnectionError(err) from err
+
+    return _async_publish
 
 
 class EnvoyDataUpdateCoordinator(DataUpdateCoordinator):
@@ -26,23 +119,460 @@ class EnvoyDataUpdateCoordinator(DataUpdateCoordinator):
         self.entry = entry
 
         scan_interval = entry.options.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
+        self.stream: bool = entry.options.get(CONF_STREAM, DEFAULT_STREAM)
+        # The domain scheduler polls while this is set, at poll_interval
+        self.polling = True
+        self.poll_interval = timedelta(seconds=scan_interval)
+        self._adaptive_interval = AdaptiveInterval(
+            scan_interval,
+            entry.options.get(CONF_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL),
+        )
 
-        self.envoy_reader = EnvoyReader(
+        self.envoy_reader = async_pop_validated_reader(
+            hass, entry.data[CONF_HOST], entry.data[CONF_TOKEN]
+        ) or EnvoyReader(
             entry.data[CONF_HOST],
             enlighten_serial_num=entry.data[CONF_SERIAL_NUMBER],
             enlighten_token=entry.data[CONF_TOKEN],
         )
+        self.envoy_reader.request_timeout = _request_deadline(self.poll_interval)
+        intervals = entry.options.get(CONF_QUALITY_INTERVALS, {})
+        self.envoy_reader.set_quality(
+            {
+                field: intervals.get(field, DEFAULT_QUALITY_INTERVAL)
+                for field in entry.options.get(CONF_QUALITY_FIELDS, ())
+            }
+        )
+
+        # Failed polls keep the last good sample while it is younger than this
+        self.stale_budget: float = entry.options.get(
+            CONF_STALE_BUDGET, DEFAULT_STALE_BUDGET
+        )
+        self.serving_stale = False
+        self._sample_time: float | None = None
+
+        self.session = async_get_envoy_session(hass, self.envoy_reader.host)
+
+        if entry.options.get(CONF_CAPTURE, DEFAULT_CAPTURE):
+            path = Path(
+                hass.config.path(
+                    f"{DOMAIN}_{entry.data[CONF_SERIAL_NUMBER]}.capture.gz"
+                )
+            )
+            LOGGER.info("Capturing Envoy responses to %s", path)
+            self.envoy_reader.capture = CaptureWriter(path)
+            self.envoy_reader.capture.start()
 
-        self.session = async_create_clientsession(hass, verify_ssl=False)
+        self.export: ExportSink | None = None
+        self._export_task: asyncio.Task[None] | None = None
+        if export_url := entry.options.get(CONF_EXPORT_URL):
+            self.export = ExportSink(
+                _async_get_export_sender(
+                    hass, export_url, entry.options.get(CONF_EXPORT_TOKEN, "")
+                ),
+                entry.data[CONF_SERIAL_NUMBER],
+            )
+
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}"
+        )
+        self._cached_topology: dict[str, Any] | None = None
+        # Created on the first data, once the keys are known
+        self.statistics: RollingStatistics | None = None
+
+        # Endpoints refreshed at their own rate, only while listened to
+        self.endpoint_data: dict[str, Any] = {}
+        self.endpoint_success: dict[str, bool] = {}
+        self._endpoint_listeners: dict[str, list[CALLBACK_TYPE]] = {}
+        self._endpoint_unsubs: dict[str, CALLBACK_TYPE] = {}
+        self._endpoint_refreshers: dict[str, int] = {}
+
+        self._topology_listeners: list[TopologyListener] = []
+        # Every sample, at the stream or poll rate, bypassing the entities
+        self._subscriptions: list[Subscription] = []
+        self._rediscovery: asyncio.Task[None] | None = None
+        self._last_rediscovery = -float(REDISCOVERY_COOLDOWN)
 
         super().__init__(
             hass,
             LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(seconds=scan_interval),
+            # Polls are staggered with the other Envoys by the scheduler
+            update_interval=None,
+        )
+
+    @property
+    def sample_age(self) -> float | None:
+        """Return the seconds since the last good sample."""
+        if self._sample_time is None:
+            return None
+        return time.monotonic() - self._sample_time
+
+    @property
+    def stale_limit(self) -> float:
+        """Return the sample age up to which failed polls keep the sample.
+
+        A budget of 0 disables it, any other is stretched to cover
+        MIN_STALE_POLLS polls.
+        """
+        if not self.stale_budget:
+            return 0.0
+        return max(
+            self.stale_budget, MIN_STALE_POLLS * self.poll_interval.total_seconds()
+        )
+
+    async def _async_setup(self) -> None:
+        """Restore the cached meter topology so startup skips discovery."""
+        if (topology := await self._store.async_load()) is None:
+            return
+        self._cached_topology = topology
+        # A reader handed over by the config flow already knows the meters
+        if not self.envoy_reader.keys:
+            LOGGER.debug("Restoring cached topology: %s", topology)
+            self.envoy_reader.restore_topology(topology)
+
+    async def async_check_topology(self) -> None:
+        """Check the cached topology against the Envoy and update the cache.
+
+        Changed meters add or retire their sensors, a changed firmware
+        updates the device.
+        """
+        cached = self._cached_topology
+        quantities = self.envoy_reader.quantities
+        if cached is not None:
+            try:
+                await self.envoy_reader.get_meters(self.session, refresh=True)
+                await self.envoy_reader.get_full_serial_number(self.session)
+            except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+                LOGGER.debug("Topology check failed: %s", err)
+                return
+
+        await self._async_update_topology(quantities)
+
+    async def async_rediscover(self) -> None:
+        """Refresh the meters after the readings stopped matching them."""
+        self._last_rediscovery = time.monotonic()
+        quantities = self.envoy_reader.quantities
+        try:
+            await self.envoy_reader.get_meters(self.session, refresh=True)
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+            LOGGER.debug("Meter rediscovery failed: %s", err)
+            return
+        await self._async_update_topology(quantities)
+
+    @callback
+    def _async_check_rediscovery(self) -> None:
+        """Rediscover the meters in the background when the readings changed."""
+        if (
+            not self.envoy_reader.topology_changed
+            or self._rediscovery is not None
+            or time.monotonic() - self._last_rediscovery < REDISCOVERY_COOLDOWN
+        ):
+            return
+
+        LOGGER.debug("Readings do not match the known meters, rediscovering")
+        self._rediscovery = self.entry.async_create_background_task(
+            self.hass, self.async_rediscover(), f"{DOMAIN} meter rediscovery"
+        )
+        self._rediscovery.add_done_callback(
+            lambda _: setattr(self, "_rediscovery", None)
+        )
+
+    async def _async_update_topology(self, quantities: dict[str, Quantity]) -> None:
+        """Cache the reader topology and apply its changes.
+
+        quantities are the keys of get_datas before the reader refreshed.
+        """
+        topology = self.envoy_reader.get_topology()
+        cached = self._cached_topology
+        if topology == cached:
+            return
+
+        self._cached_topology = topology
+        await self._store.async_save(topology)
+        if cached is None:
+            return
+
+        if topology["firmware_version"] != cached["firmware_version"]:
+            device_registry = dr.async_get(self.hass)
+            if device := device_registry.async_get_device(
+                identifiers={(DOMAIN, self.entry.data[CONF_SERIAL_NUMBER])}
+            ):
+                device_registry.async_update_device(
+                    device.id, sw_version=topology["firmware_version"]
+                )
+
+        current = self.envoy_reader.quantities
+        added = {
+            key: quantity for key, quantity in current.items() if key not in quantities
+        }
+        removed = tuple(key for key in quantities if key not in current)
+        if not added and not removed:
+            return
+
+        LOGGER.info(
+            "Envoy meters changed, adding %s, retiring %s", list(added), removed
         )
+        if self.statistics is not None:
+            self.statistics.retain(
+                key for key, quantity in current.items() if quantity is Quantity.POWER
+            )
+        for update_callback in self._topology_listeners:
+            update_callback(added, removed)
+
+    @callback
+    def async_add_topology_listener(
+        self, update_callback: TopologyListener
+    ) -> CALLBACK_TYPE:
+        """Listen for added and retired keys, return a callback removing it."""
+        self._topology_listeners.append(update_callback)
+
+        @callback
+        def _async_remove() -> None:
+            self._topology_listeners.remove(update_callback)
+
+        return _async_remove
+
+    async def async_check_topology_interval(self, now: datetime) -> None:
+        """Check the topology, for the hourly timer."""
+        await self.async_check_topology()
+
+    @callback
+    def async_subscribe(
+        self,
+        update_callback: SampleCallback,
+        delta: bool = False,
+        min_interval: float = 0.0,
+    ) -> CALLBACK_TYPE:
+        """Subscribe to every sample, return a callback removing it.
+
+        The callback gets the values of each sample, or in delta mode the
+        values changed since its previous call. Samples arriving faster than
+        min_interval seconds, or than the callback runs, are coalesced.
+        """
+        subscription = Subscription(
+            self.hass.loop, update_callback, delta=delta, min_interval=min_interval
+        )
+        self._subscriptions.append(subscription)
+
+        @callback
+        def _async_remove() -> None:
+            subscription.cancel()
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+        return _async_remove
+
+    @callback
+    def async_cancel_subscriptions(self) -> None:
+        """Stop delivering samples, on unload."""
+        for subscription in self._subscriptions:
+            subscription.cancel()
+        self._subscriptions.clear()
+
+    @callback
+    def async_add_endpoint_listener(
+        self, name: str, update_callback: CALLBACK_TYPE, refresh: bool = True
+    ) -> CALLBACK_TYPE:
+        """Listen for refreshes of an endpoint, return a callback removing it.
+
+        The endpoint is refreshed at its own interval while it has listeners
+        asking for refreshes, the others only follow those refreshes.
+        """
+        listeners = self._endpoint_listeners.setdefault(name, [])
+        listeners.append(update_callback)
+
+        if refresh:
+            self._endpoint_refreshers[name] = self._endpoint_refreshers.get(name, 0) + 1
+        if refresh and name not in self._endpoint_unsubs:
+            self._endpoint_unsubs[name] = async_track_time_interval(
+                self.hass,
+                partial(self._async_refresh_endpoint, name),
+                timedelta(seconds=ENDPOINTS[name].interval),
+            )
+            self.entry.async_create_background_task(
+                self.hass,
+                self._async_refresh_endpoint(name),
+                f"{DOMAIN} {name} refresh",
+            )
 
-    async def _async_update_data(self) -> dict[str, float]:
+        @callback
+        def _async_remove() -> None:
+            listeners.remove(update_callback)
+            if not refresh:
+                return
+            self._endpoint_refreshers[name] -= 1
+            if not self._endpoint_refreshers[name]:
+                self._endpoint_unsubs.pop(name)()
+
+        return _async_remove
+
+    async def _async_refresh_endpoint(
+        self, name: str, now: datetime | None = None
+    ) -> None:
+        """Refresh an endpoint and update its listeners only.
+
+        The timer fires once per endpoint interval, its refreshes skip the
+        cache, which would otherwise often be a hair younger than that.
+        """
+        try:
+            self.endpoint_data[name] = await self.envoy_reader.get_endpoint(
+                name, self.session, force=now is not None
+            )
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+            LOGGER.debug("Endpoint %s refresh failed: %s", name, err)
+            if self.endpoint_success.get(name) is False:
+                return
+            self.endpoint_success[name] = False
+        else:
+            self.endpoint_success[name] = True
+
+        for update_callback in self._endpoint_listeners.get(name, ()):
+            update_callback()
+
+    async def async_stop_capture(self) -> None:
+        """Write the pending captured responses and close the capture."""
+        if (capture := self.envoy_reader.capture) is not None:
+            self.envoy_reader.capture = None
+            await self.hass.async_add_executor_job(capture.close)
+
+    @callback
+    def async_start_export(self) -> None:
+        """Send the exported readings from a background task."""
+        if self.export is not None:
+            self._export_task = self.entry.async_create_background_task(
+                self.hass, self.export.async_run(), f"{DOMAIN} export"
+            )
+
+    async def async_stop_export(self) -> None:
+        """Stop the export task and send the readings still queued."""
+        if (task := self._export_task) is not None:
+            self._export_task = None
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        if self.export is not None:
+            await self.export.async_flush()
+
+    @callback
+    def async_start_stream(self) -> None:
+        """Push meter frames from the Envoy stream instead of polling."""
+        self.entry.async_create_background_task(
+            self.hass,
+            self._async_stream(),
+            f"{DOMAIN} stream {self.entry.data[CONF_HOST]}",
+        )
+
+    async def _async_stream(self) -> None:
+        """Feed stream frames to listeners, poll while the stream is down.
+
+        A stream silent for longer than the stale budget, and at least a
+        stream read timeout so a budget of 0 still reconnects, falls back to
+        polling, which reports the Envoy unavailable if it stays down, and
+        is followed again after STREAM_RETRY_DELAY.
+        """
+        while True:
+            retry = False
+            unsub_readings: CALLBACK_TYPE | None = None
+            try:
+                async for data in self.envoy_reader.stream_datas(
+                    self.session,
+                    max_silence=max(self.stale_budget, STREAM_READ_TIMEOUT),
+                ):
+                    if unsub_readings is None:
+                        self.polling = False
+                        unsub_readings = async_track_time_interval(
+                            self.hass,
+                            self._async_refresh_readings,
+                            timedelta(seconds=STREAM_READINGS_INTERVAL),
+                        )
+                    self._async_handle_sample(data)
+                    self.async_set_updated_data(data)
+            except StreamNotSupportedError as err:
+                LOGGER.info("%s, falling back to polling", err)
+            except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+                LOGGER.warning("Meter stream lost, polling until it is back: %s", err)
+                retry = True
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception(
+                    "Unexpected meter stream error, falling back to polling"
+                )
+            finally:
+                if unsub_readings is not None:
+                    unsub_readings()
+
+            self.polling = True
+            await self.async_refresh()
+            if not retry:
+                return
+            await asyncio.sleep(STREAM_RETRY_DELAY)
+
+    async def _async_refresh_readings(self, now: datetime) -> None:
+        """Poll the readings, the next stream frames pick their energy up."""
+        try:
+            await self.envoy_reader.get_datas(self.session)
+        except (
+            aiohttp.ClientError,
+            TimeoutError,
+            ValueError,
+            RequestSupersededError,
+        ) as err:
+            LOGGER.debug("Readings refresh failed: %s", err)
+        else:
+            self._async_check_rediscovery()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update all registered listeners, timing the state write fan-out."""
+        start = time.perf_counter()
+        super().async_update_listeners()
+        self.envoy_reader.metrics.record(STATE_WRITE, time.perf_counter() - start)
+
+    @callback
+    def _async_handle_sample(self, data: EnvoyData) -> None:
+        """Feed a new sample to the statistics, the export and the subscribers."""
+        self._sample_time = time.monotonic()
+        self.serving_stale = False
+        if self.statistics is None:
+            self.statistics = RollingStatistics(
+                key
+                for key, quantity in self.envoy_reader.quantities.items()
+                if quantity is Quantity.POWER
+            )
+        self.statistics.update(time.monotonic(), data)
+        if self.export is not None:
+            self.export.record(data)
+        for subscription in self._subscriptions:
+            subscription.push(data)
+
+    async def _async_update_data(self) -> EnvoyData:
         """Fetch data from IRegul."""
 
-        return await self.envoy_reader.get_datas(self.session)
+        try:
+            data = await self.envoy_reader.get_datas(self.session)
+        except RequestSupersededError as err:
+            # A newer poll is on its way, keep the current data until it lands
+            if self.data is None:
+                raise UpdateFailed(err) from err
+            return self.data
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+            # Serve the last good sample through short outages, so sensors
+            # do not flap to unavailable and back on every dropped poll
+            if (
+                self.data is None
+                or (age := self.sample_age) is None
+                or age > self.stale_limit
+            ):
+                raise
+            LOGGER.debug("Poll failed, keeping the sample of %.0f s ago: %s", age, err)
+            self.serving_stale = True
+            return self.data
+        self._async_handle_sample(data)
+        self._async_check_rediscovery()
+
+        # Poll slower while readings are stable
+        if self.polling:
+            self.poll_interval = timedelta(seconds=self._adaptive_interval.update(data))
+            self.envoy_reader.request_timeout = _request_deadline(self.poll_interval)
+
+        return data
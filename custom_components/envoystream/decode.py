@@ -0,0 +1,429 @@
+"""Precompiled decode plan for Envoy meter readings."""
+
+from __future__ import annotations
+
+import sys
+import time
+import typing
+from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from dataclasses import dataclass
+from enum import StrEnum
+
+from .const import LOGGER
+
+# Phase keys used by the meter stream, in phase order
+STREAM_PHASES = ("ph-a", "ph-b", "ph-c")
+
+
+class ChannelCountError(Exception):
+    """Error to indicate a reading has another channel count than the plan."""
+
+    def __init__(self, eid: int, count: int) -> None:
+        """Init the error."""
+        super().__init__(f"Meter {eid} reports {count} channels")
+        self.eid = eid
+        self.count = count
+
+
+class EnvoyData(Mapping[str, float]):
+    """Slot-indexed values sharing the key index of their decode plan."""
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: dict[str, int], values: list[float | None]) -> None:
+        """Init the data."""
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key: str) -> float:
+        """Return the value of a key, missing slots raise KeyError."""
+        if (value := self._values[self._index[key]]) is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        """Return True when the key has a value."""
+        slot = self._index.get(key)  # type: ignore[call-overload]
+        return slot is not None and self._values[slot] is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys with a value, in slot order."""
+        for key, value in zip(self._index, self._values, strict=True):
+            if value is not None:
+                yield key
+
+    def __len__(self) -> int:
+        """Return the number of keys with a value."""
+        return len(self._values) - self._values.count(None)
+
+
+class Quantity(StrEnum):
+    """Physical quantity of a decoded value."""
+
+    POWER = "power"
+    ENERGY = "energy"
+    RATIO = "ratio"
+    VOLTAGE = "voltage"
+    CURRENT = "current"
+    POWER_FACTOR = "power_factor"
+    REACTIVE_POWER = "reactive_power"
+    APPARENT_POWER = "apparent_power"
+    FREQUENCY = "frequency"
+
+
+# Cumulative energy counters kept per measurement type, as (field, key suffix).
+# The net-consumption meter counts imported and exported energy separately.
+ENERGY_FIELDS: dict[str, tuple[tuple[str, str], ...]] = {
+    "net-consumption": (
+        ("actEnergyDlvd", "import_energy"),
+        ("actEnergyRcvd", "export_energy"),
+    ),
+}
+DEFAULT_ENERGY_FIELDS = (("actEnergyDlvd", "energy"),)
+
+# Power quality values of the readings and their channels, decoded only when
+# selected, as key suffix -> (field, quantity)
+QUALITY_FIELDS: dict[str, tuple[str, Quantity]] = {
+    "voltage": ("voltage", Quantity.VOLTAGE),
+    "current": ("current", Quantity.CURRENT),
+    "power_factor": ("pwrFactor", Quantity.POWER_FACTOR),
+    "reactive_power": ("reactivePower", Quantity.REACTIVE_POWER),
+    "apparent_power": ("apparentPower", Quantity.APPARENT_POWER),
+    "frequency": ("freq", Quantity.FREQUENCY),
+}
+
+# Fields every inverter report of /api/v1/production/inverters holds
+INVERTER_FIELDS = frozenset({"serialNumber", "lastReportDate"})
+
+# (field, total slot, phase slots)
+FieldSlots = tuple[str, int, tuple[int, ...]]
+
+
+@dataclass(frozen=True, slots=True)
+class DerivedMetric:
+    """Value computed from other keys after each decode.
+
+    Metrics are compiled once per topology and skipped when one of their
+    inputs is missing from it. Per phase metrics also get a key for each
+    phase the inputs share.
+    """
+
+    name: str
+    quantity: Quantity
+    inputs: tuple[str, ...]
+    compute: Callable[..., float | None]
+    per_phase: bool = True
+
+
+def _self_sufficiency(self_consumption: float, consumption: float) -> float | None:
+    """Return the share of the consumption covered by the production."""
+    if consumption <= 0:
+        return None
+    return min(max(self_consumption / consumption * 100, 0.0), 100.0)
+
+
+def _phase_imbalance(*phases: float) -> float | None:
+    """Return the spread of the phases relative to their mean, in percent."""
+    mean = sum(phases) / len(phases)
+    if mean <= 0:
+        return None
+    return (max(phases) - min(phases)) / mean * 100
+
+
+# Evaluated in order, a metric can use the metrics before it
+DERIVED_METRICS = (
+    DerivedMetric(
+        "total_consumption",
+        Quantity.POWER,
+        ("production", "net-consumption"),
+        lambda production, net: production + net,
+    ),
+    DerivedMetric(
+        "total_consumption_energy",
+        Quantity.ENERGY,
+        (
+            "production_energy",
+            "net-consumption_import_energy",
+            "net-consumption_export_energy",
+        ),
+        lambda production, imported, exported: production + imported - exported,
+    ),
+    DerivedMetric(
+        "grid_import",
+        Quantity.POWER,
+        ("net-consumption",),
+        lambda net: max(net, 0.0),
+    ),
+    DerivedMetric(
+        "grid_export",
+        Quantity.POWER,
+        ("net-consumption",),
+        lambda net: max(-net, 0.0),
+    ),
+    DerivedMetric(
+        "self_consumption",
+        Quantity.POWER,
+        ("production", "grid_export"),
+        lambda production, exported: max(production - exported, 0.0),
+        per_phase=False,
+    ),
+    DerivedMetric(
+        "self_sufficiency",
+        Quantity.RATIO,
+        ("self_consumption", "total_consumption"),
+        _self_sufficiency,
+        per_phase=False,
+    ),
+)
+
+# Phase imbalance of these keys, for sites with more than one phase
+IMBALANCE_KEYS = ("total_consumption",)
+
+
+class DecodePlan:
+    """Keys and slot indexes compiled once per meter topology."""
+
+    __slots__ = (
+        "_next_sample",
+        "_previous",
+        "channels",
+        "derived",
+        "index",
+        "keys",
+        "meters",
+        "quality",
+        "quantities",
+        "sampling",
+        "streams",
+        "topology_mismatch",
+    )
+
+    def __init__(
+        self,
+        meters: dict[int, str],
+        channels: dict[int, int],
+        quality: Mapping[str, float] | None = None,
+    ) -> None:
+        """Compile the plan for the given meters and their channel counts.
+
+        quality maps the selected QUALITY_FIELDS suffixes to the seconds
+        between two samples of them, 0 samples them on every decode.
+        """
+        # Set when readings show meters the plan does not know, or miss some
+        self.topology_mismatch = False
+        keys: list[str] = []
+        quantities: list[Quantity] = []
+
+        def slot(key: str, quantity: Quantity) -> int:
+            keys.append(sys.intern(key))
+            quantities.append(quantity)
+            return len(keys) - 1
+
+        def field_slots(name: str, count: int, quantity: Quantity) -> tuple[int, ...]:
+            """Add the total and phase slots of a value, total first."""
+            return (slot(name, quantity),) + tuple(
+                slot(f"{name}_phase_{phase_number}", quantity)
+                for phase_number in range(1, count + 1)
+            )
+
+        self.channels = channels
+        # eid -> slots of each field read from the reading and its channels
+        self.meters: dict[int, tuple[FieldSlots, ...]] = {}
+        # eid -> slots of the selected power quality fields, empty without
+        self.quality: dict[int, tuple[FieldSlots, ...]] = {}
+        # (field, sampling interval, slots of every meter)
+        sampling: dict[str, tuple[float, list[int]]] = {}
+        # key -> (total slot, phase slots)
+        named: dict[str, tuple[int, ...]] = {}
+        for eid, reading_type in meters.items():
+            fields: list[FieldSlots] = []
+            for field, name, quantity in (
+                ("instantaneousDemand", reading_type, Quantity.POWER),
+                *(
+                    (field, f"{reading_type}_{suffix}", Quantity.ENERGY)
+                    for field, suffix in ENERGY_FIELDS.get(
+                        reading_type, DEFAULT_ENERGY_FIELDS
+                    )
+                ),
+            ):
+                slots = named[name] = field_slots(name, channels[eid], quantity)
+                fields.append((field, slots[0], slots[1:]))
+            self.meters[eid] = tuple(fields)
+
+            if quality:
+                fields = []
+                for suffix, interval in quality.items():
+                    field, quantity = QUALITY_FIELDS[suffix]
+                    slots = field_slots(
+                        f"{reading_type}_{suffix}", channels[eid], quantity
+                    )
+                    fields.append((field, slots[0], slots[1:]))
+                    sampling.setdefault(field, (interval, []))[1].extend(slots)
+                self.quality[eid] = tuple(fields)
+        self.sampling = tuple(
+            (field, interval, tuple(slots))
+            for field, (interval, slots) in sampling.items()
+        )
+        self._next_sample: dict[str, float] = {}
+        # Values of the last readings, unsampled quality fields keep theirs
+        self._previous: list[float | None] | None = None
+
+        # The stream only carries power
+        self.streams = tuple(
+            (
+                reading_type,
+                named[reading_type][0],
+                tuple(zip(STREAM_PHASES, named[reading_type][1:], strict=False)),
+            )
+            for reading_type in dict.fromkeys(meters.values())
+        )
+
+        # Derived metrics, as (destination slot, input slots, compute)
+        derived: list[tuple[int, tuple[int, ...], Callable[..., float | None]]] = []
+        for metric in DERIVED_METRICS:
+            if not all(key in named for key in metric.inputs):
+                continue
+            count = (
+                min(len(named[key]) for key in metric.inputs) if metric.per_phase else 1
+            )
+            for i, dst in enumerate(
+                field_slots(metric.name, count - 1, metric.quantity)
+            ):
+                derived.append(
+                    (dst, tuple(named[key][i] for key in metric.inputs), metric.compute)
+                )
+            named[metric.name] = tuple(entry[0] for entry in derived[-count:])
+
+        for key in IMBALANCE_KEYS:
+            if len(phase_slots := named.get(key, ())[1:]) > 1:
+                derived.append(
+                    (
+                        slot(f"{key}_phase_imbalance", Quantity.RATIO),
+                        phase_slots,
+                        _phase_imbalance,
+                    )
+                )
+        self.derived = tuple(derived)
+
+        self.keys = tuple(keys)
+        self.quantities = tuple(quantities)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+
+    def new_values(self) -> list[float | None]:
+        """Return an empty slot list for one decode pass."""
+        return [None] * len(self.keys)
+
+    def finish(self, values: list[float | None]) -> EnvoyData:
+        """Compute the derived metrics in one pass and wrap the values."""
+        for dst, inputs, compute in self.derived:
+            args = [values[i] for i in inputs]
+            values[dst] = None if None in args else compute(*args)
+        return EnvoyData(self.index, values)
+
+    def decode_readings(self, readings: list[dict[str, typing.Any]]) -> EnvoyData:
+        """Convert a /ivp/meters/readings payload in one pass."""
+        values = self.new_values()
+        meters = self.meters
+        quality = self.quality
+        due = self._sample_quality(values) if quality else frozenset()
+        known = 0
+
+        for reading in readings:
+            if (fields := meters.get(reading["eid"])) is None:
+                LOGGER.debug("Unknown meter eid: %s", reading["eid"])
+                self.topology_mismatch = True
+                continue
+            known += 1
+
+            channels = reading["channels"]
+            if len(channels) != self.channels[reading["eid"]]:
+                raise ChannelCountError(reading["eid"], len(channels))
+
+            for field, total, phases in fields:
+                values[total] = reading.get(field)
+                for phase_slot, phase in zip(phases, channels, strict=True):
+                    values[phase_slot] = phase.get(field)
+
+            if due:
+                for field, total, phases in quality[reading["eid"]]:
+                    if field not in due:
+                        continue
+                    values[total] = reading.get(field)
+                    for phase_slot, phase in zip(phases, channels, strict=True):
+                        values[phase_slot] = phase.get(field)
+
+        if known != len(meters):
+            self.topology_mismatch = True
+        if quality:
+            self._previous = values
+        return self.finish(values)
+
+    def _sample_quality(self, values: list[float | None]) -> frozenset[str]:
+        """Return the quality fields due for a sample.
+
+        The others keep the values of the previous readings.
+        """
+        now = time.monotonic()
+        previous = self._previous
+        due = []
+        for field, interval, slots in self.sampling:
+            if now >= self._next_sample.get(field, 0.0):
+                self._next_sample[field] = now + interval
+                due.append(field)
+            elif previous is not None:
+                for slot in slots:
+                    values[slot] = previous[slot]
+        return frozenset(due)
+
+    def decode_stream_frame(
+        self, frame: dict[str, typing.Any], base: EnvoyData | None = None
+    ) -> EnvoyData:
+        """Convert a meter stream frame to the readings layout.
+
+        Values the stream does not carry, like energy, are copied from base,
+        by key when base was decoded by a previous plan.
+        """
+        if base is None:
+            values = self.new_values()
+        elif base._index is self.index:
+            values = base._values.copy()
+        else:
+            values = self.new_values()
+            index = self.index
+            for key, value in base.items():
+                if (slot := index.get(key)) is not None:
+                    values[slot] = value
+
+        for reading_type, total, phases in self.streams:
+            if (meter := frame.get(reading_type)) is None:
+                continue
+
+            power_sum = 0.0
+            for phase, phase_slot in phases:
+                if (channel := meter.get(phase)) is None:
+                    continue
+                power = channel["p"]
+                values[phase_slot] = power
+                power_sum += power
+            values[total] = power_sum
+
+        return self.finish(values)
+
+
+def index_inverters(
+    inverters: typing.Any,
+) -> dict[str, dict[str, typing.Any]]:
+    """Index a /api/v1/production/inverters payload by serial number.
+
+    Built once per refresh, every inverter sensor then looks its own up.
+    Raises ValueError when the payload is not a list of inverter reports,
+    like the error a firmware without the endpoint answers with.
+    """
+    if not isinstance(inverters, list) or not all(
+        isinstance(inverter, dict) and inverter.keys() >= INVERTER_FIELDS
+        for inverter in inverters
+    ):
+        raise ValueError(f"Unexpected inverters payload: {inverters!r:.100}")
+    return {inverter["serialNumber"]: inverter for inverter in inverters}
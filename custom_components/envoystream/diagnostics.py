@@ -0,0 +1,45 @@
+"""Diagnostics support for envoystream."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_TOKEN
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_EXPORT_TOKEN
+from .const import DOMAIN
+from .coordinator import EnvoyDataUpdateCoordinator
+
+TO_REDACT = {CONF_TOKEN, CONF_EXPORT_TOKEN}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: EnvoyDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    reader = coordinator.envoy_reader
+
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": async_redact_data(entry.options, TO_REDACT),
+        },
+        "topology": reader.get_topology() if reader.keys else None,
+        "polling": coordinator.polling,
+        "poll_interval": coordinator.poll_interval.total_seconds(),
+        "last_update_success": coordinator.last_update_success,
+        "serving_stale": coordinator.serving_stale,
+        "sample_age": coordinator.sample_age,
+        "data": dict(coordinator.data) if coordinator.data is not None else None,
+        "metrics": reader.metrics.as_dict(),
+        "capture": (
+            {"path": str(reader.capture.path), "dropped": reader.capture.dropped}
+            if reader.capture is not None
+            else None
+        ),
+        "export": coordinator.export.as_dict() if coordinator.export else None,
+    }
@@ -1,22 +1,123 @@
-"""Module to read production and consumption values from an Enphase Envoy on the local network."""
+"""Module to read production and consumption values from an Enphase Envoy on the local network.
+
+The reader and the modules it imports do not depend on Home Assistant, so
+the headless collector starts without it. jwt is only imported once a
+token is given, the XML parser by the request needing it.
+"""
 
 from __future__ import annotations
 
+import asyncio
+import ipaddress
+import logging
+import time
 import typing
-import xml.etree.ElementTree as ET
+from collections.abc import AsyncIterator
+from collections.abc import Callable
+from dataclasses import dataclass
 from datetime import UTC
 from datetime import datetime
+from datetime import timedelta
 
 import aiohttp
-import jwt
-from homeassistant.util.network import is_ipv6_address
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+from .breaker import CircuitBreaker
+from .capture import CAPTURE_ENDPOINTS
+from .capture import CaptureWriter
+from .capture import ReplaySource
 from .const import LOGGER
+from .decode import ChannelCountError
+from .decode import DecodePlan
+from .decode import EnvoyData
+from .decode import index_inverters
+from .decode import Quantity
+from .metrics import DECODE
+from .metrics import PARSE
+from .metrics import POLL
+from .metrics import PollMetrics
 
 INFO_URL = "https://{}/info.json"
+AUTH_URL = "https://{}/auth/check_jwt"
 
 METERS_URL = "https://{}/ivp/meters"
 READINGS_URL = f"{METERS_URL}/readings"
+STREAM_URL = "https://{}/stream/meter"
+PRODUCTION_URL = "https://{}/api/v1/production"
+INVERTERS_URL = f"{PRODUCTION_URL}/inverters"
+# The Envoy sends several frames per second, a silent stream is a dead one
+STREAM_READ_TIMEOUT = 30
+STREAM_RECONNECT_DELAY = 1
+STREAM_MAX_RECONNECT_DELAY = 60
+# Seconds before following a stream again after it was given up
+STREAM_RETRY_DELAY = 30.0
+# The stream only carries power, readings still refresh the energy counters
+# every this many seconds
+STREAM_READINGS_INTERVAL = 60.0
+# Deadline of a request when the caller sets none, in seconds
+DEFAULT_REQUEST_TIMEOUT = 10.0
+# Cookie the Envoy sets once it validated the token
+SESSION_COOKIE = "sessionId"
+# The Envoy does not announce its session lifetime, renew it well before
+SESSION_LIFETIME = timedelta(hours=1)
+# Sessions are renewed this long before the token expires
+SESSION_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+@dataclass(frozen=True, slots=True)
+class Endpoint:
+    """Envoy endpoint refreshed at its own rate, apart from the readings."""
+
+    url: str
+    # Seconds between refreshes, also the age until which the cache is served
+    interval: float
+    # Converts the payload once per refresh, for every listener
+    decode: Callable[[typing.Any], typing.Any] | None = None
+
+
+# Endpoints changing much slower than the meter readings
+ENDPOINTS = {
+    "production": Endpoint(PRODUCTION_URL, 60.0),
+    "inverters": Endpoint(INVERTERS_URL, 300.0, index_inverters),
+}
+
+
+class StreamNotSupportedError(Exception):
+    """Error to indicate the Envoy does not expose the meter stream."""
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """Error to indicate requests are held back while the Envoy keeps failing."""
+
+
+class RequestSupersededError(Exception):
+    """Error to indicate a readings request was cancelled by a newer one."""
+
+
+def _is_ipv6_address(host: str) -> bool:
+    """Return True if a host is an IPv6 address."""
+    try:
+        ipaddress.IPv6Address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def normalize_host(host: str) -> str:
+    """Return a host as the reader requests it, IPv6 addresses in brackets."""
+    host = host.lower()
+    if _is_ipv6_address(host):
+        return f"[{host}]"
+    return host
+
+
+def _silent_for(last_frame: float, max_silence: float | None) -> bool:
+    """Return True if the stream has been silent for longer than max_silence."""
+    return max_silence is not None and time.monotonic() - last_frame > max_silence
 
 
 class EnvoyReader:
@@ -29,16 +130,38 @@ class EnvoyReader:
         enlighten_token: str | None = None,
     ) -> None:
         """Init the EnvoyReader."""
-        self.host: str = host.lower()
-        # IPv6 addresses need to be enclosed in brackets
-        if is_ipv6_address(self.host):
-            self.host = f"[{self.host}]"
+        self.host = normalize_host(host)
         self.enlighten_serial_num = enlighten_serial_num
         self.enlighten_token = enlighten_token
         self.firmware_version: str | None = None
-        self._meters: dict[str, str] | None = None
+        self._meters: dict[int, str] | None = None
         self._phase_count: int = 0
+        self._plan: DecodePlan | None = None
+        # Power quality key suffix -> seconds between samples, see set_quality
+        self._quality: dict[str, float] = {}
+        # Last readings, the stream takes the values it lacks from them
+        self._last_data: EnvoyData | None = None
         self._expirydate: datetime | None = None
+        self.metrics = PollMetrics()
+        # Endpoint path -> circuit breaker, so one failing endpoint does not
+        # hold the others back
+        self.breakers: dict[str, CircuitBreaker] = {}
+        # Endpoint name -> (monotonic time fetched, payload)
+        self._endpoint_cache: dict[str, tuple[float, typing.Any]] = {}
+        # Deadline of each request, in seconds
+        self.request_timeout = DEFAULT_REQUEST_TIMEOUT
+        self._readings_request: asyncio.Future[typing.Any] | None = None
+        # Session cookie exchanged for the token, so the Envoy validates the
+        # JWT once instead of on every request
+        self._session_id: str | None = None
+        self._session_expiry: datetime | None = None
+        # Cleared when the firmware does not hand out session cookies
+        self._use_session = True
+        self._auth_lock = asyncio.Lock()
+        # Raw responses are appended to capture, replay answers in place of
+        # the Envoy, to reproduce field incidents offline
+        self.capture: CaptureWriter | None = None
+        self.replay: ReplaySource | None = None
 
         if self.enlighten_token is not None:
             self._get_expiry_date(self.enlighten_token)
@@ -48,6 +171,23 @@ class EnvoyReader:
         """Return the expiration date of the current token."""
         return self._expirydate
 
+    @property
+    def keys(self) -> tuple[str, ...]:
+        """Return the keys of get_datas for the known meter topology."""
+        return self._plan.keys if self._plan is not None else ()
+
+    @property
+    def topology_changed(self) -> bool:
+        """Return True when the readings no longer match the known meters."""
+        return self._plan is not None and self._plan.topology_mismatch
+
+    @property
+    def quantities(self) -> dict[str, Quantity]:
+        """Return the quantity of each key of get_datas."""
+        if self._plan is None:
+            return {}
+        return dict(zip(self._plan.keys, self._plan.quantities, strict=True))
+
     async def _async_get(
         self,
         url: str,
@@ -55,71 +195,366 @@ class EnvoyReader:
         is_json: bool = True,
         is_retry: bool = False,
     ) -> typing.Any:
-        url = url.format(self.host)
-        LOGGER.debug("HTTP GET Attempt: %s", url)
-        headers = {"Authorization": f"Bearer {self.enlighten_token}"}
-        async with http_session.get(url, headers=headers) as resp:
-            if is_retry:
-                resp.raise_for_status()
+        """Send a request through the circuit breaker of its endpoint."""
+        endpoint = url.partition("{}")[2]
+        if self.replay is not None:
+            body = await self.replay.async_get(endpoint)
+            return json_loads(body) if is_json else body.decode()
+
+        if (breaker := self.breakers.get(endpoint)) is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker()
+        if not breaker.allow():
+            raise CircuitOpenError(
+                f"Envoy {self.host}{endpoint} keeps failing, next try in"
+                f" {breaker.retry_in():.0f} s"
+            )
+
+        try:
+            result = await self._async_request(url, http_session, is_json, is_retry)
+        except aiohttp.ClientResponseError as err:
+            # Only server errors mean the Envoy is struggling
+            if err.status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.release()
+            raise
+        except (aiohttp.ClientError, TimeoutError):
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+
+        breaker.record_success()
+        return result
 
-            if resp.status == 401:
+    def _auth_headers(self) -> dict[str, str]:
+        """Return the session cookie, or the token when there is no session."""
+        if self._session_id is not None:
+            return {"Cookie": f"{SESSION_COOKIE}={self._session_id}"}
+        return {"Authorization": f"Bearer {self.enlighten_token}"}
+
+    def _invalidate_session(self, session_id: str | None) -> bool:
+        """Drop a session the Envoy refused, return True if it was in use."""
+        if session_id is None or session_id != self._session_id:
+            # Unauthenticated or already renewed by another request
+            return session_id is not None
+        self._session_id = None
+        return True
+
+    async def _async_authenticate(self, http_session: aiohttp.ClientSession) -> None:
+        """Exchange the token for a session cookie when none is valid."""
+        if not self._use_session or self.enlighten_token is None:
+            return
+        if (
+            self._session_id is not None
+            and self._session_expiry is not None
+            and datetime.now(UTC) < self._session_expiry
+        ):
+            return
+
+        async with self._auth_lock:
+            if self._session_id is not None and (
+                self._session_expiry is None or datetime.now(UTC) < self._session_expiry
+            ):
+                return
+
+            url = AUTH_URL.format(self.host)
+            LOGGER.debug("HTTP GET Attempt: %s", url)
+            start = time.perf_counter()
+            async with http_session.get(
+                url,
+                headers={"Authorization": f"Bearer {self.enlighten_token}"},
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                trace_request_ctx=self.metrics,
+            ) as resp:
+                if resp.status == 401 or resp.status >= 500:
+                    resp.raise_for_status()
+                await resp.read()
+                self.metrics.record(
+                    f"request {AUTH_URL.partition('{}')[2]}",
+                    time.perf_counter() - start,
+                )
+                cookie = resp.cookies.get(SESSION_COOKIE)
+
+            if resp.status != 200 or cookie is None:
+                LOGGER.debug(
+                    "No session cookie from the Envoy (%s), sending the token",
+                    resp.status,
+                )
+                self._use_session = False
+                self._session_id = None
+                return
+
+            self._session_id = cookie.value
+            self._session_expiry = datetime.now(UTC) + SESSION_LIFETIME
+            if self._expirydate is not None:
+                self._session_expiry = min(
+                    self._session_expiry, self._expirydate - SESSION_REFRESH_MARGIN
+                )
+            LOGGER.debug("Envoy session valid until %s", self._session_expiry)
+
+    async def _async_request(
+        self,
+        url: str,
+        http_session: aiohttp.ClientSession,
+        is_json: bool,
+        is_retry: bool,
+    ) -> typing.Any:
+        await self._async_authenticate(http_session)
+        session_id = self._session_id
+
+        endpoint = url.partition("{}")[2]
+        full_url = url.format(self.host)
+        LOGGER.debug("HTTP GET Attempt: %s", full_url)
+        metrics = self.metrics
+        start = time.perf_counter()
+        # The session trace config records the connection time into metrics
+        async with http_session.get(
+            full_url,
+            headers=self._auth_headers(),
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            trace_request_ctx=metrics,
+        ) as resp:
+            if is_retry:
                 resp.raise_for_status()
 
-            if is_json:
-                return await resp.json(content_type=None)
-            else:
-                return await resp.text()
+            if resp.status != 401 or not self._invalidate_session(session_id):
+                if resp.status == 401 or resp.status >= 500:
+                    resp.raise_for_status()
+
+                body = await resp.read()
+                received = time.perf_counter()
+                metrics.record(f"request {endpoint}", received - start)
+                metrics.add_bytes(endpoint, len(body))
+                if self.capture is not None and endpoint in CAPTURE_ENDPOINTS:
+                    self.capture.record(endpoint, received - start, body)
+
+                if is_json:
+                    # Parse the raw body, skipping the str decode of resp.json
+                    result = json_loads(body)
+                    metrics.record(PARSE, time.perf_counter() - received)
+                    return result
+                else:
+                    return body.decode(resp.get_encoding())
+
+        # The session expired, authenticate again and retry once
+        LOGGER.debug("Envoy session refused, authenticating again")
+        return await self._async_request(url, http_session, is_json, True)
+
+    async def _async_stream(
+        self, url: str, http_session: aiohttp.ClientSession
+    ) -> AsyncIterator[typing.Any]:
+        """Yield the JSON frames of a server-sent events endpoint."""
+        await self._async_authenticate(http_session)
+        url = url.format(self.host)
+        LOGGER.debug("HTTP stream Attempt: %s", url)
+        headers = self._auth_headers()
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=STREAM_READ_TIMEOUT)
+        async with http_session.get(url, headers=headers, timeout=timeout) as resp:
+            resp.raise_for_status()
+            async for line in resp.content:
+                if line.startswith(b"data:"):
+                    yield json_loads(line[5:])
 
     def _get_expiry_date(self, jwt_token: str) -> None:
         """Decode the token and store its expiry date."""
+        import jwt  # pylint: disable=import-outside-toplevel
+
         decoded_token = jwt.decode(jwt_token, options={"verify_signature": False})
         self._expirydate = datetime.fromtimestamp(decoded_token["exp"], tz=UTC)
         LOGGER.debug("Token expiry date: %s", self._expirydate)
 
-    async def get_meters(self, http_session: aiohttp.ClientSession) -> dict[str, str]:
-        """Get."""
-        if self._meters is None:
+    async def get_meters(
+        self, http_session: aiohttp.ClientSession, refresh: bool = False
+    ) -> dict[int, str]:
+        """Get the meters and compile their decode plan."""
+        if self._meters is None or refresh:
             meters = await self._async_get(METERS_URL, http_session)
 
+            known = self._meters
             self._meters = {}
             for meter in meters:
                 self._meters[meter["eid"]] = meter["measurementType"]
                 self._phase_count = meter["phaseCount"]
 
+            if self._meters == known and self._plan is not None:
+                # Same meters, the plan and its slots stay valid
+                self._plan.topology_mismatch = False
+                return self._meters
+
+            # Keep the channel counts already seen in readings
+            channels = self._plan.channels if self._plan is not None else {}
+            self._plan = DecodePlan(
+                self._meters,
+                {eid: channels.get(eid, self._phase_count) for eid in self._meters},
+                self._quality,
+            )
+
         return self._meters
 
-    async def get_datas(self, http_session: aiohttp.ClientSession) -> dict[str, float]:
+    def set_quality(self, quality: dict[str, float]) -> None:
+        """Select the power quality fields of get_datas and their sampling.
+
+        quality maps QUALITY_FIELDS suffixes to the seconds between two
+        samples. Unselected fields are not decoded at all.
+        """
+        self._quality = quality
+        if self._meters is not None and self._plan is not None:
+            self._plan = DecodePlan(self._meters, self._plan.channels, quality)
+
+    def get_topology(self) -> dict[str, typing.Any]:
+        """Return the meter topology and firmware version, for caching."""
+        assert self._meters is not None and self._plan is not None
+        return {
+            "meters": [
+                [eid, reading_type, self._plan.channels[eid]]
+                for eid, reading_type in self._meters.items()
+            ],
+            "phase_count": self._phase_count,
+            "firmware_version": self.firmware_version,
+        }
+
+    def restore_topology(self, topology: dict[str, typing.Any]) -> None:
+        """Restore a topology returned by get_topology, skipping discovery."""
+        self._meters = {
+            eid: reading_type for eid, reading_type, _ in topology["meters"]
+        }
+        self._phase_count = topology["phase_count"]
+        self._plan = DecodePlan(
+            self._meters,
+            {eid: channels for eid, _, channels in topology["meters"]},
+            self._quality,
+        )
+        self.firmware_version = topology["firmware_version"]
+
+    async def get_datas(self, http_session: aiohttp.ClientSession) -> EnvoyData:
         """Fetch data from the endpoint."""
         await self.get_meters(http_session)
-        assert self._meters is not None
-
-        readings = await self._async_get(READINGS_URL, http_session)
-
-        result: dict[str, float] = {}
-
-        for reading in readings:
-            if reading["eid"] not in self._meters:
-                LOGGER.debug("Unknown meter eid: %s", reading["eid"])
-                continue
-            reading_type = self._meters[reading["eid"]]
-
-            result[f"{reading_type}"] = reading["instantaneousDemand"]
-
-            phase_number: int = 1
-            for phase in reading["channels"]:
-                result[f"{reading_type}_phase_{phase_number}"] = phase[
-                    "instantaneousDemand"
-                ]
-                phase_number += 1
-
-        # Add full consumption
-        result["total_consumption"] = result["production"] + result["net-consumption"]
-        for i in range(1, self._phase_count + 1):
-            result[f"total_consumption_phase_{i}"] = (
-                result[f"production_phase_{i}"] + result[f"net-consumption_phase_{i}"]
-            )
-
-        return result
+        assert self._meters is not None and self._plan is not None
+
+        start = time.perf_counter()
+        readings = await self._async_get_readings(http_session)
+
+        while True:
+            try:
+                decode_start = time.perf_counter()
+                self._last_data = self._plan.decode_readings(readings)
+                end = time.perf_counter()
+                self.metrics.record(DECODE, end - decode_start)
+                self.metrics.record(POLL, end - start)
+                if LOGGER.isEnabledFor(logging.DEBUG):
+                    LOGGER.debug(
+                        "Poll took %.1f ms: %s",
+                        (end - start) * 1000,
+                        {
+                            name: f"{histogram.last * 1000:.1f} ms"
+                            for name, histogram in self.metrics.histograms.items()
+                        },
+                    )
+                return self._last_data
+            except ChannelCountError as err:
+                LOGGER.debug("%s, recompiling decode plan", err)
+                self._plan = DecodePlan(
+                    self._meters,
+                    {**self._plan.channels, err.eid: err.count},
+                    self._quality,
+                )
+
+    async def _async_get_readings(
+        self, http_session: aiohttp.ClientSession
+    ) -> typing.Any:
+        """Get the readings, cancelling an older request still waiting for them.
+
+        Raises RequestSupersededError when a newer request cancels this one.
+        """
+        if self._readings_request is not None:
+            self._readings_request.cancel()
+        request = self._readings_request = asyncio.ensure_future(
+            self._async_get(READINGS_URL, http_session)
+        )
+        try:
+            return await request
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if task is not None and task.cancelling():
+                raise
+            raise RequestSupersededError("Readings request superseded") from None
+        finally:
+            if self._readings_request is request:
+                self._readings_request = None
+
+    async def stream_datas(
+        self, http_session: aiohttp.ClientSession, max_silence: float | None = None
+    ) -> AsyncIterator[EnvoyData]:
+        """Yield data for each frame of the meter stream.
+
+        The connection is reopened when it drops or stalls. Once no frame
+        arrived for max_silence seconds, the last connection error is raised
+        instead. Raises StreamNotSupportedError when the firmware does not
+        expose the stream.
+        """
+        await self.get_meters(http_session)
+        assert self._plan is not None
+
+        delay = STREAM_RECONNECT_DELAY
+        reauthenticated = False
+        last_frame = time.monotonic()
+        while True:
+            try:
+                async for frame in self._async_stream(STREAM_URL, http_session):
+                    last_frame = time.monotonic()
+                    delay = STREAM_RECONNECT_DELAY
+                    reauthenticated = False
+                    yield self._plan.decode_stream_frame(frame, self._last_data)
+            except aiohttp.ClientResponseError as err:
+                if (
+                    err.status == 401
+                    and not reauthenticated
+                    and self._invalidate_session(self._session_id)
+                ):
+                    # The session expired, authenticate again right away
+                    reauthenticated = True
+                    continue
+                if err.status in (401, 403, 404):
+                    raise StreamNotSupportedError(
+                        f"Meter stream unavailable: {err.status}"
+                    ) from err
+                LOGGER.debug("Meter stream error: %s", err)
+                if _silent_for(last_frame, max_silence):
+                    raise
+            except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+                LOGGER.debug("Meter stream interrupted: %s", err)
+                if _silent_for(last_frame, max_silence):
+                    raise
+
+            LOGGER.debug("Reconnecting meter stream in %s s", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STREAM_MAX_RECONNECT_DELAY)
+
+    async def get_endpoint(
+        self, name: str, http_session: aiohttp.ClientSession, force: bool = False
+    ) -> typing.Any:
+        """Return the payload of an endpoint of ENDPOINTS.
+
+        The cached payload is returned while younger than the endpoint
+        interval, so listeners sharing an endpoint fetch it once. force
+        fetches it anyway, for the refreshes timed at that interval.
+        """
+        endpoint = ENDPOINTS[name]
+        now = time.monotonic()
+        if (
+            not force
+            and (cached := self._endpoint_cache.get(name)) is not None
+            and now - cached[0] < endpoint.interval
+        ):
+            return cached[1]
+
+        payload = await self._async_get(endpoint.url, http_session)
+        if endpoint.decode is not None:
+            payload = endpoint.decode(payload)
+        self._endpoint_cache[name] = (now, payload)
+        return payload
 
     async def get_full_serial_number(
         self, http_session: aiohttp.ClientSession
@@ -127,6 +562,8 @@ class EnvoyReader:
         """Get serial number and firmware version."""
 
         infos = await self._async_get(INFO_URL, http_session, is_json=False)
+        import xml.etree.ElementTree as ET  # pylint: disable=import-outside-toplevel
+
         infos_obj = ET.fromstring(infos)
         if (device := infos_obj.find("device")) is None:
             raise ValueError("Device information not found")
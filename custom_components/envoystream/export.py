@@ -0,0 +1,163 @@
+"""Batched export of every Envoy reading as InfluxDB line protocol.
+
+Each reading becomes one line holding all its keys, timestamped at the
+poll. Lines wait in a bounded queue and are sent in batches, so a slow or
+unreachable database never holds a poll back: the oldest lines are dropped
+once the queue is full.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Mapping
+
+import aiohttp
+
+from .const import LOGGER
+
+MEASUREMENT = "envoy"
+
+# Lines waiting to be sent, the oldest are dropped beyond
+MAX_PENDING = 10_000
+# Lines in one request or message
+BATCH_SIZE = 500
+# Seconds a line may wait for more to fill its batch
+FLUSH_INTERVAL = 1.0
+# Delay before resending a failed batch, doubled on each failure
+RETRY_BACKOFF = 1.0
+MAX_RETRY_BACKOFF = 60.0
+# Seconds the last batches may take to send on unload
+CLOSE_TIMEOUT = 5.0
+
+# Sends a batch of newline separated lines, raising on failure
+ExportSender = Callable[[bytes], Awaitable[object]]
+
+
+def _escape_tag(value: str) -> str:
+    """Escape a tag value of the line protocol."""
+    return value.replace(",", r"\,").replace("=", r"\=").replace(" ", r"\ ")
+
+
+def format_line(tags: str, data: Mapping[str, float], timestamp_ns: int) -> str | None:
+    """Return the line of a reading, None when it has no value."""
+    if not (fields := ",".join(f"{key}={value!r}" for key, value in data.items())):
+        return None
+    return f"{MEASUREMENT},{tags} {fields} {timestamp_ns}"
+
+
+class HttpExportSender:
+    """Post batches to an InfluxDB compatible write endpoint."""
+
+    def __init__(
+        self, session: aiohttp.ClientSession, url: str, token: str | None = None
+    ) -> None:
+        """Init the sender, url includes the bucket and the ns precision."""
+        self._session = session
+        self._url = url
+        self._headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if token:
+            self._headers["Authorization"] = f"Token {token}"
+
+    async def __call__(self, payload: bytes) -> None:
+        """Send a batch."""
+        async with self._session.post(
+            self._url,
+            data=payload,
+            headers=self._headers,
+            timeout=aiohttp.ClientTimeout(total=10),
+        ) as resp:
+            resp.raise_for_status()
+
+
+class ExportSink:
+    """Queue reading lines and send them in batches from a background task."""
+
+    def __init__(
+        self,
+        send: ExportSender,
+        serial: str,
+        max_pending: int = MAX_PENDING,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ) -> None:
+        """Init the sink, async_run sends the queued lines."""
+        self._send = send
+        self._tags = f"serial={_escape_tag(serial)}"
+        self._pending: deque[str] = deque(maxlen=max_pending)
+        self._wakeup = asyncio.Event()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.sent = 0
+        self.failures = 0
+
+    def record(
+        self, data: Mapping[str, float], timestamp_ns: int | None = None
+    ) -> None:
+        """Queue a reading, never waits."""
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        if (line := format_line(self._tags, data, timestamp_ns)) is None:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(line)
+        self._wakeup.set()
+
+    async def async_run(self) -> None:
+        """Send the queued lines until cancelled."""
+        backoff = RETRY_BACKOFF
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if len(self._pending) < self.batch_size:
+                # Let a few more readings join the batch
+                await asyncio.sleep(self.flush_interval)
+
+            while self._pending:
+                count, batch = self._take_batch()
+                while True:
+                    try:
+                        await self._send(batch)
+                    except (aiohttp.ClientError, TimeoutError, OSError) as err:
+                        self.failures += 1
+                        LOGGER.debug("Export failed, retrying in %ss: %s", backoff, err)
+                        await asyncio.sleep(backoff)
+                        backoff = min(backoff * 2, MAX_RETRY_BACKOFF)
+                    else:
+                        self.sent += count
+                        backoff = RETRY_BACKOFF
+                        break
+
+    async def async_flush(self) -> None:
+        """Send the queued lines once, dropping them on failure."""
+        try:
+            async with asyncio.timeout(CLOSE_TIMEOUT):
+                while self._pending:
+                    count, batch = self._take_batch()
+                    await self._send(batch)
+                    self.sent += count
+        except (aiohttp.ClientError, TimeoutError, OSError) as err:
+            LOGGER.debug(
+                "Final export failed, %s lines lost: %s", len(self._pending), err
+            )
+            self._pending.clear()
+
+    def _take_batch(self) -> tuple[int, bytes]:
+        """Pop the oldest lines, up to a batch, and return their count."""
+        count = min(len(self._pending), self.batch_size)
+        popleft = self._pending.popleft
+        return count, "\n".join([popleft() for _ in range(count)]).encode()
+
+    def as_dict(self) -> dict[str, int]:
+        """Return the counters for diagnostics."""
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
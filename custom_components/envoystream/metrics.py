@@ -0,0 +1,120 @@
+"""Cheap always-on timing histograms of the poll hot path."""
+
+from __future__ import annotations
+
+import typing
+from bisect import bisect_left
+
+# Upper bounds of the latency buckets, in seconds, the last bucket is open
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    1.5,
+    2.0,
+    5.0,
+    10.0,
+)
+
+# Stages timed by the reader and the coordinator
+CONNECT = "connect"
+PARSE = "parse"
+DECODE = "decode"
+POLL = "poll"
+STATE_WRITE = "state_write"
+
+
+class Histogram:
+    """Fixed bucket histogram of durations, recording is a bisect and two adds."""
+
+    __slots__ = ("count", "counts", "last", "max", "total")
+
+    def __init__(self) -> None:
+        """Init an empty histogram."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Add a duration."""
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float | None:
+        """Return the upper bound of the bucket holding a percentile."""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts, strict=False):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        """Return a summary for diagnostics."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "last": self.last,
+            "buckets": dict(
+                zip((*map(str, LATENCY_BUCKETS), "inf"), self.counts, strict=True)
+            ),
+        }
+
+
+class PollMetrics:
+    """Timing histograms and byte counters of an Envoy."""
+
+    def __init__(self) -> None:
+        """Init empty metrics."""
+        self.histograms: dict[str, Histogram] = {}
+        # Name -> histogram since the last take_recent, so sensors report
+        # the current latency rather than the lifetime one
+        self.recent: dict[str, Histogram] = {}
+        # Endpoint path -> bytes received
+        self.bytes_received: dict[str, int] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add a duration to a histogram."""
+        if (histogram := self.histograms.get(name)) is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(seconds)
+        if (recent := self.recent.get(name)) is None:
+            recent = self.recent[name] = Histogram()
+        recent.record(seconds)
+
+    def take_recent(self, name: str) -> Histogram | None:
+        """Return the durations recorded since the previous call, if any."""
+        return self.recent.pop(name, None)
+
+    def add_bytes(self, endpoint: str, size: int) -> None:
+        """Count the bytes of a response body."""
+        self.bytes_received[endpoint] = self.bytes_received.get(endpoint, 0) + size
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        """Return a summary for diagnostics."""
+        return {
+            "histograms": {
+                name: histogram.as_dict() for name, histogram in self.histograms.items()
+            },
+            "bytes_received": dict(self.bytes_received),
+        }
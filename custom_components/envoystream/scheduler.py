@@ -0,0 +1,180 @@
+"""Domain level scheduler staggering the polls of every Envoy."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+from collections.abc import Callable
+
+from homeassistant.core import CALLBACK_TYPE
+from homeassistant.core import callback
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import EnvoyDataUpdateCoordinator
+
+DATA_SCHEDULER = f"{DOMAIN}_scheduler"
+
+# Envoys polled at the same time, the others wait for a free slot
+MAX_CONCURRENT_POLLS = 2
+
+# Site wide aggregate key -> key summed over every Envoy
+SITE_KEYS = {
+    "site_production": "production",
+    "site_consumption": "total_consumption",
+    "site_net_consumption": "net-consumption",
+}
+
+
+@callback
+def async_get_scheduler(hass: HomeAssistant) -> EnvoyScheduler:
+    """Return the scheduler shared by every config entry."""
+    if (scheduler := hass.data.get(DATA_SCHEDULER)) is None:
+        scheduler = hass.data[DATA_SCHEDULER] = EnvoyScheduler(hass)
+    return scheduler
+
+
+class EnvoyScheduler:
+    """Poll every Envoy from one place.
+
+    Polls are spread evenly across each Envoy's interval instead of firing
+    together, at most MAX_CONCURRENT_POLLS are in flight and the site wide
+    aggregate is computed in one pass after each update.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Init the scheduler."""
+        self.hass = hass
+        self.site_data: dict[str, float] = {}
+        self._members: dict[str, EnvoyDataUpdateCoordinator] = {}
+        self._handles: dict[str, asyncio.TimerHandle] = {}
+        self._in_flight: set[str] = set()
+        self._unsub_listeners: dict[str, CALLBACK_TYPE] = {}
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_POLLS)
+        self._site_listeners: list[CALLBACK_TYPE] = []
+        # entry id -> callback adding the site sensors to its platform
+        self._site_platforms: dict[str, CALLBACK_TYPE] = {}
+        self._site_owner: str | None = None
+
+    @callback
+    def async_add(self, coordinator: EnvoyDataUpdateCoordinator) -> CALLBACK_TYPE:
+        """Start polling an Envoy, return a callback removing it."""
+        entry_id = coordinator.entry.entry_id
+        self._members[entry_id] = coordinator
+        self._unsub_listeners[entry_id] = coordinator.async_add_listener(
+            self._async_update_site
+        )
+        self._async_reschedule()
+
+        @callback
+        def _async_remove() -> None:
+            self._members.pop(entry_id)
+            self._unsub_listeners.pop(entry_id)()
+            if handle := self._handles.pop(entry_id, None):
+                handle.cancel()
+            self._async_reschedule()
+            self._async_update_site()
+
+            self._site_platforms.pop(entry_id, None)
+            if self._site_owner == entry_id:
+                self._site_owner = None
+                self._async_add_site_sensors()
+
+        return _async_remove
+
+    @callback
+    def _async_reschedule(self) -> None:
+        """Spread the polls again after the members changed."""
+        for entry_id in self._members:
+            # Envoys being polled reschedule themselves when done
+            if entry_id in self._in_flight:
+                continue
+            if handle := self._handles.pop(entry_id, None):
+                handle.cancel()
+            self._async_schedule(entry_id)
+
+    @callback
+    def _async_schedule(self, entry_id: str) -> None:
+        """Schedule the next poll of an Envoy at its phase of the interval."""
+        coordinator = self._members[entry_id]
+        interval = coordinator.poll_interval.total_seconds()
+        offset = list(self._members).index(entry_id) / len(self._members) * interval
+        now = self.hass.loop.time()
+        when = (math.floor((now - offset) / interval) + 1) * interval + offset
+        self._handles[entry_id] = self.hass.loop.call_at(
+            when, self._async_fire, entry_id
+        )
+
+    @callback
+    def _async_fire(self, entry_id: str) -> None:
+        """Start the poll of an Envoy."""
+        del self._handles[entry_id]
+        self._in_flight.add(entry_id)
+        coordinator = self._members[entry_id]
+        coordinator.entry.async_create_background_task(
+            self.hass,
+            self._async_poll(entry_id, coordinator),
+            f"{DOMAIN} poll {coordinator.entry.title}",
+        )
+
+    async def _async_poll(
+        self, entry_id: str, coordinator: EnvoyDataUpdateCoordinator
+    ) -> None:
+        """Poll an Envoy when a slot is free, then schedule its next poll."""
+        try:
+            # Streaming Envoys push their data, they are only polled again
+            # when the stream falls back to polling
+            if coordinator.polling:
+                async with self._semaphore:
+                    await coordinator.async_refresh()
+        finally:
+            self._in_flight.discard(entry_id)
+            if self._members.get(entry_id) is coordinator:
+                self._async_schedule(entry_id)
+
+    @callback
+    def _async_update_site(self) -> None:
+        """Sum the site wide values over every Envoy in one pass."""
+        site_data = dict.fromkeys(SITE_KEYS, 0.0)
+        for coordinator in self._members.values():
+            if not coordinator.last_update_success or coordinator.data is None:
+                continue
+            data = coordinator.data
+            for site_key, key in SITE_KEYS.items():
+                if (value := data.get(key)) is not None:
+                    site_data[site_key] += value
+        self.site_data = site_data
+
+        for update_callback in self._site_listeners:
+            update_callback()
+
+    @callback
+    def async_add_site_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """Listen for site aggregate updates, return a callback removing it."""
+        self._site_listeners.append(update_callback)
+
+        @callback
+        def _async_remove() -> None:
+            self._site_listeners.remove(update_callback)
+
+        return _async_remove
+
+    @callback
+    def async_add_site_platform(
+        self, entry_id: str, add_site_sensors: Callable[[], None]
+    ) -> None:
+        """Register a sensor platform able to hold the site sensors.
+
+        The site sensors live on one entry at a time, they move to another
+        entry when theirs is unloaded.
+        """
+        self._site_platforms[entry_id] = add_site_sensors
+        self._async_add_site_sensors()
+
+    @callback
+    def _async_add_site_sensors(self) -> None:
+        """Add the site sensors to a platform if no entry holds them."""
+        if self._site_owner is not None or not self._site_platforms:
+            return
+        self._site_owner, add_site_sensors = next(iter(self._site_platforms.items()))
+        add_site_sensors()
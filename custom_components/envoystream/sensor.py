@@ -1,24 +1,100 @@
 """Sensor platform for envoystream."""
 
+import abc
+import asyncio
+import time
 from collections.abc import Callable
 from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
 
+import aiohttp
+from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.components.sensor import SensorDeviceClass
 from homeassistant.components.sensor import SensorStateClass
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import EntityCategory
+from homeassistant.const import PERCENTAGE
+from homeassistant.const import UnitOfApparentPower
+from homeassistant.const import UnitOfElectricCurrent
+from homeassistant.const import UnitOfElectricPotential
+from homeassistant.const import UnitOfEnergy
+from homeassistant.const import UnitOfFrequency
 from homeassistant.const import UnitOfPower
+from homeassistant.const import UnitOfReactivePower
+from homeassistant.const import UnitOfTime
 from homeassistant.core import callback
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .const import CONF_DEADBAND_PERCENT
+from .const import CONF_DEADBAND_WATT_HOURS
+from .const import CONF_DEADBAND_WATTS
+from .const import CONF_MAX_QUIET_INTERVAL
 from .const import CONF_SERIAL_NUMBER
+from .const import DEFAULT_DEADBAND_PERCENT
+from .const import DEFAULT_DEADBAND_WATT_HOURS
+from .const import DEFAULT_DEADBAND_WATTS
+from .const import DEFAULT_MAX_QUIET_INTERVAL
 from .const import DOMAIN
+from .const import LOGGER
 from .const import NAME
 from .coordinator import EnvoyDataUpdateCoordinator
+from .decode import QUALITY_FIELDS
+from .decode import Quantity
+from .metrics import CONNECT
+from .metrics import DECODE
+from .metrics import PARSE
+from .metrics import POLL
+from .metrics import STATE_WRITE
+from .scheduler import async_get_scheduler
+from .scheduler import EnvoyScheduler
+from .scheduler import SITE_KEYS
+from .stats import STATISTICS
+from .stats import WINDOWS
+
+ATTR_SAMPLE_AGE = "sample_age"
+
+# Ratios are written when they move by this many percentage points
+RATIO_DEADBAND = 1.0
+
+# Power quality sensors are written when they move by this much
+QUALITY_DEADBANDS = {
+    Quantity.VOLTAGE: 1.0,
+    Quantity.CURRENT: 0.1,
+    Quantity.POWER_FACTOR: 0.01,
+    Quantity.FREQUENCY: 0.05,
+}
+
+# Microinverter sensors added per event loop iteration
+INVERTER_BATCH_SIZE = 50
+
+# Rolling statistics and poll metrics reach the recorder at this cadence only
+STATISTICS_WRITE_INTERVAL = timedelta(seconds=60)
+
+
+@dataclass(frozen=True, slots=True)
+class Deadband:
+    """Change needed before a sensor writes its state again."""
+
+    absolute: float
+    percent: float
+    max_quiet: float
+
+    def is_significant(self, old: float | None, new: float | None) -> bool:
+        """Return True when the change from old to new must be written."""
+        if old is None or new is None:
+            return old is not new
+        delta = abs(new - old)
+        return delta > 0 and delta >= max(self.absolute, abs(old) * self.percent / 100)
 
 
 class EnvoyCoordinatorSensorEntity(  # type: ignore
@@ -48,14 +124,201 @@ async def async_setup_entry(
             coordinator.session
         )
     device_info = _get_device_info(serial_number, firmware_version)
+    deadbands = _get_deadbands(entry)
 
-    sensors: list[Entity] = [
-        EnvoyStreamSensor(coordinator, serial_number, id, device_info)
-        for id in coordinator.data
-    ]
+    sensors = _get_value_sensors(
+        coordinator,
+        serial_number,
+        coordinator.envoy_reader.quantities,
+        device_info,
+        deadbands,
+    )
+    sensors.extend(
+        EnvoyMetricSensor(coordinator, serial_number, stage, device_info)
+        for stage in (POLL, CONNECT, PARSE, DECODE, STATE_WRITE)
+    )
+    sensors.extend(
+        EnvoyProductionSensor(coordinator, serial_number, value_name, device_info)
+        for value_name in PRODUCTION_FIELDS
+    )
     sensors.append(EnvoyTokenExpirationSensor(coordinator, serial_number, device_info))
 
     async_add_entities(sensors)
+    _async_remove_unselected_quality_sensors(
+        hass, entry, serial_number, coordinator.envoy_reader.quantities
+    )
+
+    @callback
+    def _async_topology_changed(
+        added: dict[str, Quantity], removed: tuple[str, ...]
+    ) -> None:
+        """Add the sensors of new keys and retire those of removed keys."""
+        async_add_entities(
+            _get_value_sensors(
+                coordinator, serial_number, added, device_info, deadbands
+            )
+        )
+        entity_registry = er.async_get(hass)
+        for key in removed:
+            for name in (
+                key,
+                *(
+                    f"{key}_{window}_{statistic}"
+                    for window in WINDOWS
+                    for statistic in STATISTICS
+                ),
+            ):
+                if entity_id := entity_registry.async_get_entity_id(
+                    SENSOR_DOMAIN, DOMAIN, _get_unique_id(serial_number, name)
+                ):
+                    entity_registry.async_remove(entity_id)
+
+    entry.async_on_unload(
+        coordinator.async_add_topology_listener(_async_topology_changed)
+    )
+
+    entry.async_create_background_task(
+        hass,
+        _async_add_inverter_sensors(
+            hass, entry, coordinator, serial_number, async_add_entities
+        ),
+        f"{DOMAIN} inverter discovery",
+    )
+
+    scheduler = async_get_scheduler(hass)
+    scheduler.async_add_site_platform(
+        entry.entry_id,
+        lambda: async_add_entities(
+            EnvoySiteSensor(scheduler, site_key, deadbands[Quantity.POWER])
+            for site_key in SITE_KEYS
+        ),
+    )
+
+
+@callback
+def _async_remove_unselected_quality_sensors(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    serial_number: str,
+    quantities: dict[str, Quantity],
+) -> None:
+    """Remove the power quality sensors of fields no longer selected."""
+    entity_registry = er.async_get(hass)
+    current = {_get_unique_id(serial_number, key) for key in quantities}
+    suffixes = tuple(f"_{suffix}" for suffix in QUALITY_FIELDS)
+    phase_suffixes = tuple(f"{suffix}_phase_" for suffix in suffixes)
+    for entity in er.async_entries_for_config_entry(entity_registry, entry.entry_id):
+        unique_id = entity.unique_id
+        if unique_id in current or not unique_id.startswith(f"{serial_number}_"):
+            continue
+        if unique_id.endswith(suffixes) or any(
+            suffix in unique_id for suffix in phase_suffixes
+        ):
+            entity_registry.async_remove(entity.entity_id)
+
+
+def _get_value_sensors(
+    coordinator: EnvoyDataUpdateCoordinator,
+    serial_number: str,
+    quantities: dict[str, Quantity],
+    device_info: DeviceInfo,
+    deadbands: dict[Quantity, Deadband],
+) -> list[Entity]:
+    """Build the sensors of get_datas keys and of their rolling statistics."""
+    sensors: list[Entity] = [
+        SENSOR_CLASSES[quantity](
+            coordinator, serial_number, id, device_info, deadbands[quantity]
+        )
+        for id, quantity in quantities.items()
+    ]
+    if coordinator.statistics is not None:
+        sensors.extend(
+            EnvoyStatisticSensor(
+                coordinator, serial_number, key, window, statistic, device_info
+            )
+            for key in quantities
+            if key in coordinator.statistics.windows
+            for window in WINDOWS
+            for statistic in STATISTICS
+        )
+    return sensors
+
+
+async def _async_add_inverter_sensors(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    coordinator: EnvoyDataUpdateCoordinator,
+    serial_number: str,
+    async_add_entities: Callable[[Iterable[Entity]], None],
+) -> None:
+    """Add the sensors of every microinverter, in batches.
+
+    Large sites have over a hundred inverters, adding their sensors in
+    batches keeps the event loop responsive during startup. Registered
+    inverters are restored without asking the Envoy, whose inverters are
+    only fetched on the first setup; inverters installed later show up in
+    the refreshes an enabled inverter sensor makes.
+    """
+    added: set[str] = set()
+
+    def _get_sensors(inverters: dict[str, dict[str, Any]]) -> list[Entity]:
+        """Build the sensors of the inverters not added yet."""
+        sensors: list[Entity] = []
+        for inverter_serial, inverter in inverters.items():
+            if inverter_serial in added:
+                continue
+            added.add(inverter_serial)
+            device_info = DeviceInfo(
+                identifiers={(DOMAIN, inverter_serial)},
+                name=f"Inverter {inverter_serial}",
+                manufacturer="Enphase",
+                via_device=(DOMAIN, serial_number),
+            )
+            # Left out when unknown, not to clear the registered model
+            if model := inverter.get("devType"):
+                device_info["model"] = str(model)
+            sensors.extend(
+                sensor_class(coordinator, inverter_serial, device_info)
+                for sensor_class in (
+                    EnvoyInverterPowerSensor,
+                    EnvoyInverterReportSensor,
+                )
+            )
+        return sensors
+
+    @callback
+    def _async_inverters_refreshed() -> None:
+        """Add the sensors of inverters new to a refresh."""
+        if sensors := _get_sensors(coordinator.endpoint_data.get("inverters") or {}):
+            async_add_entities(sensors)
+
+    entry.async_on_unload(
+        coordinator.async_add_endpoint_listener(
+            "inverters", _async_inverters_refreshed, refresh=False
+        )
+    )
+
+    suffix = f"_{EnvoyInverterReportSensor.value_name}"
+    inverters: dict[str, dict[str, Any]] = {
+        entity.unique_id.removesuffix(suffix): {}
+        for entity in er.async_entries_for_config_entry(
+            er.async_get(hass), entry.entry_id
+        )
+        if entity.unique_id.endswith(suffix)
+    }
+    if not inverters:
+        try:
+            inverters = await coordinator.envoy_reader.get_endpoint(
+                "inverters", coordinator.session
+            )
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+            LOGGER.debug("No microinverter data: %s", err)
+            return
+
+    sensors = _get_sensors(inverters)
+    for start in range(0, len(sensors), INVERTER_BATCH_SIZE):
+        async_add_entities(sensors[start : start + INVERTER_BATCH_SIZE])
+        await asyncio.sleep(0)
 
 
 def _get_unique_id(envoy_id: str, name: str) -> str:
@@ -66,6 +329,37 @@ def _get_name(envoy_id: str) -> str:
     return f"{NAME} {envoy_id}"
 
 
+def _get_deadbands(entry: ConfigEntry) -> dict[Quantity, Deadband]:
+    """Build the deadbands of each sensor class from the entry options."""
+    max_quiet = entry.options.get(CONF_MAX_QUIET_INTERVAL, DEFAULT_MAX_QUIET_INTERVAL)
+    deadbands = {
+        Quantity.POWER: Deadband(
+            absolute=entry.options.get(CONF_DEADBAND_WATTS, DEFAULT_DEADBAND_WATTS),
+            percent=entry.options.get(CONF_DEADBAND_PERCENT, DEFAULT_DEADBAND_PERCENT),
+            max_quiet=max_quiet,
+        ),
+        # Counters only grow, a relative deadband would grow with them
+        Quantity.ENERGY: Deadband(
+            absolute=entry.options.get(
+                CONF_DEADBAND_WATT_HOURS, DEFAULT_DEADBAND_WATT_HOURS
+            ),
+            percent=0,
+            max_quiet=max_quiet,
+        ),
+        Quantity.RATIO: Deadband(
+            absolute=RATIO_DEADBAND, percent=0, max_quiet=max_quiet
+        ),
+        **{
+            quantity: Deadband(absolute=absolute, percent=0, max_quiet=max_quiet)
+            for quantity, absolute in QUALITY_DEADBANDS.items()
+        },
+    }
+    # Reactive and apparent power move like the active power
+    power = deadbands[Quantity.POWER]
+    deadbands[Quantity.REACTIVE_POWER] = deadbands[Quantity.APPARENT_POWER] = power
+    return deadbands
+
+
 def _get_device_info(serial_number: str, firmware_version: str | None) -> DeviceInfo:
     """Build the shared device info."""
     return DeviceInfo(
@@ -91,11 +385,14 @@ class EnvoyStreamSensor(EnvoyCoordinatorSensorEntity):
         serial_number: str,
         value_name: str,
         device_info: DeviceInfo,
+        deadband: Deadband,
     ) -> None:
         """Initialize the sensor."""
         super().__init__(coordinator)
         self.serial_number = serial_number
         self.value_name = value_name
+        self._deadband = deadband
+        self._last_write = time.monotonic()
         self._attr_name = (
             _get_name(self.serial_number)
             + " "
@@ -112,14 +409,418 @@ class EnvoyStreamSensor(EnvoyCoordinatorSensorEntity):
             and self.value_name in self.coordinator.data
         )
         self._attr_native_value = self.coordinator.data.get(self.value_name)
+        # Only set while a failed poll left the last good sample in place, it
+        # rides along with the writes the deadband lets through
+        self._attr_extra_state_attributes = (
+            {ATTR_SAMPLE_AGE: round(age)}
+            if self.coordinator.serving_stale
+            and (age := self.coordinator.sample_age) is not None
+            else None
+        )
 
     @callback
     def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
+        """Handle updated data from the coordinator.
+
+        The state is only written when the value leaves the deadband, the
+        availability changes or the quiet interval expires. A change of the
+        sample age alone never writes, so a dropped poll costs no write.
+        """
+        available = self._attr_available
+        value = self._attr_native_value
         self._update_attrs()
+
+        now = time.monotonic()
+        if (
+            available == self._attr_available
+            and now - self._last_write < self._deadband.max_quiet
+            and not self._deadband.is_significant(value, self._attr_native_value)
+        ):
+            # Keep the last written value as the deadband reference
+            self._attr_native_value = value
+            return
+
+        self._last_write = now
         self.async_write_ha_state()
 
 
+class EnvoyEnergySensor(EnvoyStreamSensor):
+    """Energy sensor read from the cumulative meter counters."""
+
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_native_unit_of_measurement = UnitOfEnergy.WATT_HOUR
+    _attr_suggested_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+
+    def _update_attrs(self) -> None:
+        """Update entity attributes from coordinator data."""
+        previous = self._attr_native_value
+        super()._update_attrs()
+
+        # Total consumption combines several counters and can dip slightly,
+        # which the recorder would take for a meter reset
+        value = self._attr_native_value
+        if (
+            isinstance(previous, int | float)
+            and isinstance(value, int | float)
+            and previous / 2 < value < previous
+        ):
+            self._attr_native_value = previous
+
+
+class EnvoyRatioSensor(EnvoyStreamSensor):
+    """Ratio derived from the power values, in percent."""
+
+    _attr_device_class = None
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_suggested_display_precision = 1
+
+
+class EnvoyVoltageSensor(EnvoyStreamSensor):
+    """Voltage of a meter or one of its phases."""
+
+    _attr_device_class = SensorDeviceClass.VOLTAGE
+    _attr_native_unit_of_measurement = UnitOfElectricPotential.VOLT
+
+
+class EnvoyCurrentSensor(EnvoyStreamSensor):
+    """Current of a meter or one of its phases."""
+
+    _attr_device_class = SensorDeviceClass.CURRENT
+    _attr_native_unit_of_measurement = UnitOfElectricCurrent.AMPERE
+
+
+class EnvoyPowerFactorSensor(EnvoyStreamSensor):
+    """Power factor of a meter or one of its phases, from -1 to 1."""
+
+    _attr_device_class = SensorDeviceClass.POWER_FACTOR
+    _attr_native_unit_of_measurement = None
+    _attr_suggested_display_precision = 2
+
+
+class EnvoyReactivePowerSensor(EnvoyStreamSensor):
+    """Reactive power of a meter or one of its phases."""
+
+    _attr_device_class = SensorDeviceClass.REACTIVE_POWER
+    _attr_native_unit_of_measurement = UnitOfReactivePower.VOLT_AMPERE_REACTIVE
+
+
+class EnvoyApparentPowerSensor(EnvoyStreamSensor):
+    """Apparent power of a meter or one of its phases."""
+
+    _attr_device_class = SensorDeviceClass.APPARENT_POWER
+    _attr_native_unit_of_measurement = UnitOfApparentPower.VOLT_AMPERE
+
+
+class EnvoyFrequencySensor(EnvoyStreamSensor):
+    """Grid frequency seen by a meter or one of its phases."""
+
+    _attr_device_class = SensorDeviceClass.FREQUENCY
+    _attr_native_unit_of_measurement = UnitOfFrequency.HERTZ
+
+
+SENSOR_CLASSES: dict[Quantity, type[EnvoyStreamSensor]] = {
+    Quantity.POWER: EnvoyStreamSensor,
+    Quantity.ENERGY: EnvoyEnergySensor,
+    Quantity.RATIO: EnvoyRatioSensor,
+    Quantity.VOLTAGE: EnvoyVoltageSensor,
+    Quantity.CURRENT: EnvoyCurrentSensor,
+    Quantity.POWER_FACTOR: EnvoyPowerFactorSensor,
+    Quantity.REACTIVE_POWER: EnvoyReactivePowerSensor,
+    Quantity.APPARENT_POWER: EnvoyApparentPowerSensor,
+    Quantity.FREQUENCY: EnvoyFrequencySensor,
+}
+
+
+class EnvoyPeriodicSensor(EnvoyCoordinatorSensorEntity):
+    """Sensor written once a minute instead of on every update."""
+
+    coordinator: EnvoyDataUpdateCoordinator
+    _attr_entity_registry_enabled_default = False
+
+    async def async_added_to_hass(self) -> None:
+        """Write the state at a low cadence."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_track_time_interval(
+                self.hass, self._async_write_periodic, STATISTICS_WRITE_INTERVAL
+            )
+        )
+
+    @abc.abstractmethod
+    def _update_attrs(self) -> None:
+        """Update entity attributes."""
+
+    @callback
+    def _async_write_periodic(self, now: datetime) -> None:
+        """Write the current state."""
+        self._update_attrs()
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator, only write on outage."""
+        if self._attr_available and not self.coordinator.last_update_success:
+            self._attr_available = False
+            self.async_write_ha_state()
+
+
+class EnvoyStatisticSensor(EnvoyPeriodicSensor):
+    """Rolling statistic of a power value."""
+
+    _attr_device_class = SensorDeviceClass.POWER
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfPower.WATT
+
+    def __init__(
+        self,
+        coordinator: EnvoyDataUpdateCoordinator,
+        serial_number: str,
+        value_name: str,
+        window: str,
+        statistic: str,
+        device_info: DeviceInfo,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.serial_number = serial_number
+        self.value_name = value_name
+        self.window = window
+        self.statistic = statistic
+        name = f"{value_name}_{window}_{statistic}"
+        self._attr_name = (
+            _get_name(self.serial_number)
+            + " "
+            + name.replace("_", " ").replace("-", " ").title()
+        )
+        self._attr_unique_id = _get_unique_id(self.serial_number, name)
+        self._attr_device_info = device_info
+        self._update_attrs()
+
+    def _update_attrs(self) -> None:
+        """Update entity attributes from the rolling statistics."""
+        statistics = self.coordinator.statistics
+        self._attr_native_value = (
+            statistics.get(self.value_name, self.window, self.statistic)
+            if statistics is not None
+            else None
+        )
+        self._attr_available = (
+            self.coordinator.last_update_success and self._attr_native_value is not None
+        )
+
+
+class EnvoyMetricSensor(EnvoyPeriodicSensor):
+    """95th percentile duration of a poll stage over the last write interval."""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_suggested_display_precision = 1
+
+    def __init__(
+        self,
+        coordinator: EnvoyDataUpdateCoordinator,
+        serial_number: str,
+        stage: str,
+        device_info: DeviceInfo,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.serial_number = serial_number
+        self.stage = stage
+        self._attr_name = (
+            f"{_get_name(self.serial_number)} "
+            f"{stage.replace('_', ' ').title()} Duration"
+        )
+        self._attr_unique_id = _get_unique_id(self.serial_number, f"{stage}_duration")
+        self._attr_device_info = device_info
+        self._update_attrs()
+
+    def _update_attrs(self) -> None:
+        """Update entity attributes from the timings since the last write.
+
+        A write interval without a timing keeps the previous value.
+        """
+        metrics = self.coordinator.envoy_reader.metrics
+        if (histogram := metrics.take_recent(self.stage)) is not None:
+            p95 = histogram.percentile(95)
+            self._attr_native_value = p95 * 1000 if p95 is not None else None
+        self._attr_available = self._attr_native_value is not None
+
+
+class EnvoyEndpointSensor(SensorEntity):
+    """Sensor fed by an endpoint refreshed at its own rate.
+
+    Only the sensors of an endpoint update when it refreshes, the readings
+    polls do not touch them.
+    """
+
+    endpoint: str
+    _attr_should_poll = False
+
+    def __init__(
+        self,
+        coordinator: EnvoyDataUpdateCoordinator,
+        serial_number: str,
+        value_name: str,
+        device_info: DeviceInfo,
+    ) -> None:
+        """Initialize the sensor."""
+        self.coordinator = coordinator
+        self.serial_number = serial_number
+        self.value_name = value_name
+        self._attr_name = (
+            _get_name(self.serial_number)
+            + " "
+            + self.value_name.replace("_", " ").title()
+        )
+        self._attr_unique_id = _get_unique_id(self.serial_number, self.value_name)
+        self._attr_device_info = device_info
+        self._attr_available = False
+
+    async def async_added_to_hass(self) -> None:
+        """Listen for refreshes of the endpoint."""
+        await super().async_added_to_hass()
+        self._update_attrs()
+        self.async_on_remove(
+            self.coordinator.async_add_endpoint_listener(
+                self.endpoint, self._handle_endpoint_update
+            )
+        )
+
+    @abc.abstractmethod
+    def _update_attrs(self) -> None:
+        """Update entity attributes from the endpoint payload."""
+
+    @callback
+    def _handle_endpoint_update(self) -> None:
+        """Handle a refresh of the endpoint, only write on change."""
+        state = (self._attr_native_value, self._attr_available)
+        self._update_attrs()
+        if state != (self._attr_native_value, self._attr_available):
+            self.async_write_ha_state()
+
+
+# Sensor -> (field of /api/v1/production, state class)
+PRODUCTION_FIELDS: dict[str, tuple[str, SensorStateClass | None]] = {
+    "production_today": ("wattHoursToday", SensorStateClass.TOTAL_INCREASING),
+    # A sliding sum, neither a measurement nor a growing total
+    "production_seven_days": ("wattHoursSevenDays", None),
+    "production_lifetime": ("wattHoursLifetime", SensorStateClass.TOTAL_INCREASING),
+}
+
+
+class EnvoyProductionSensor(EnvoyEndpointSensor):
+    """Production totals kept by the Envoy."""
+
+    endpoint = "production"
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_native_unit_of_measurement = UnitOfEnergy.WATT_HOUR
+    _attr_suggested_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+    # Each enabled sensor adds polls of the production endpoint
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(
+        self,
+        coordinator: EnvoyDataUpdateCoordinator,
+        serial_number: str,
+        value_name: str,
+        device_info: DeviceInfo,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, serial_number, value_name, device_info)
+        self._field, self._attr_state_class = PRODUCTION_FIELDS[value_name]
+
+    def _update_attrs(self) -> None:
+        """Update entity attributes from the endpoint payload."""
+        payload = self.coordinator.endpoint_data.get(self.endpoint)
+        self._attr_native_value = (
+            payload.get(self._field) if isinstance(payload, dict) else None
+        )
+        self._attr_available = (
+            self.coordinator.endpoint_success.get(self.endpoint, False)
+            and self._attr_native_value is not None
+        )
+
+
+class EnvoyInverterSensor(EnvoyEndpointSensor):
+    """Microinverter sensor, written only when the inverter reports again.
+
+    Every inverter sensor looks its inverter up in the index built once per
+    refresh of the inverters endpoint.
+    """
+
+    endpoint = "inverters"
+    _attr_entity_registry_enabled_default = False
+    value_name: str
+
+    def __init__(
+        self,
+        coordinator: EnvoyDataUpdateCoordinator,
+        inverter_serial: str,
+        device_info: DeviceInfo,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, inverter_serial, self.value_name, device_info)
+        self._attr_name = (
+            f"Inverter {inverter_serial} {self.value_name.replace('_', ' ').title()}"
+        )
+        self._last_report: int | None = None
+
+    def _update_attrs(self) -> None:
+        """Update entity attributes from the inverter index."""
+        inverters = self.coordinator.endpoint_data.get(self.endpoint)
+        inverter = inverters.get(self.serial_number) if inverters else None
+        self._attr_available = (
+            self.coordinator.endpoint_success.get(self.endpoint, False)
+            and inverter is not None
+        )
+        if inverter is not None:
+            self._last_report = inverter["lastReportDate"]
+            self._update_value(inverter)
+
+    @abc.abstractmethod
+    def _update_value(self, inverter: dict[str, Any]) -> None:
+        """Update the value from the inverter report."""
+
+    @callback
+    def _handle_endpoint_update(self) -> None:
+        """Handle a refresh of the endpoint, only write on a new report."""
+        state = (self._last_report, self._attr_available)
+        self._update_attrs()
+        if state != (self._last_report, self._attr_available):
+            self.async_write_ha_state()
+
+
+class EnvoyInverterPowerSensor(EnvoyInverterSensor):
+    """Power of a microinverter at its last report."""
+
+    value_name = "power"
+    _attr_device_class = SensorDeviceClass.POWER
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfPower.WATT
+
+    def _update_value(self, inverter: dict[str, Any]) -> None:
+        """Update the value from the inverter report."""
+        self._attr_native_value = inverter.get("lastReportWatts")
+
+
+class EnvoyInverterReportSensor(EnvoyInverterSensor):
+    """Date of the last report of a microinverter."""
+
+    value_name = "last_report"
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def _update_value(self, inverter: dict[str, Any]) -> None:
+        """Update the value from the inverter report."""
+        self._attr_native_value = datetime.fromtimestamp(
+            inverter["lastReportDate"], tz=UTC
+        )
+
+
 class EnvoyTokenExpirationSensor(EnvoyCoordinatorSensorEntity):
     """Sensor exposing the token expiration date."""
 
@@ -150,6 +851,57 @@ class EnvoyTokenExpirationSensor(EnvoyCoordinatorSensorEntity):
 
     @callback
     def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
+        """Handle updated data from the coordinator, only write on change."""
+        state = (self._attr_native_value, self._attr_available)
         self._update_attrs()
+        if state != (self._attr_native_value, self._attr_available):
+            self.async_write_ha_state()
+
+
+class EnvoySiteSensor(SensorEntity):
+    """Power summed over every configured Envoy."""
+
+    _attr_device_class = SensorDeviceClass.POWER
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfPower.WATT
+    _attr_should_poll = False
+    # Only useful with several Envoys
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(
+        self, scheduler: EnvoyScheduler, site_key: str, deadband: Deadband
+    ) -> None:
+        """Initialize the sensor."""
+        self.scheduler = scheduler
+        self.site_key = site_key
+        self._deadband = deadband
+        self._last_write = time.monotonic()
+        self._attr_name = f"{NAME} {site_key.replace('_', ' ').title()}"
+        self._attr_unique_id = f"{DOMAIN}_{site_key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, "site")},
+            name=f"{NAME} Site",
+            manufacturer="Enphase",
+        )
+        self._attr_native_value = scheduler.site_data.get(site_key)
+
+    async def async_added_to_hass(self) -> None:
+        """Listen for site aggregate updates."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.scheduler.async_add_site_listener(self._handle_site_update)
+        )
+
+    @callback
+    def _handle_site_update(self) -> None:
+        """Write the aggregate when it leaves the deadband."""
+        value = self.scheduler.site_data.get(self.site_key)
+        now = time.monotonic()
+        if now - self._last_write < self._deadband.max_quiet and not (
+            self._deadband.is_significant(self._attr_native_value, value)
+        ):
+            return
+
+        self._attr_native_value = value
+        self._last_write = now
         self.async_write_ha_state()
@@ -0,0 +1,138 @@
+"""Dedicated HTTP sessions and validated readers of Envoy hosts."""
+
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import aiohttp
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import callback
+from homeassistant.core import Event
+from homeassistant.core import HomeAssistant
+from homeassistant.util.ssl import get_default_no_verify_context
+
+from .const import DOMAIN
+from .envoy_reader import EnvoyReader
+from .envoy_reader import normalize_host
+from .metrics import CONNECT
+from .metrics import PollMetrics
+
+DATA_SESSIONS = f"{DOMAIN}_sessions"
+DATA_VALIDATED_READERS = f"{DOMAIN}_validated_readers"
+
+# Seconds a reader validated by the config flow waits for its entry setup
+VALIDATED_READER_TTL = 600
+
+# The Envoy handshakes slowly, keep its connection open between polls
+KEEPALIVE_TIMEOUT = 60
+# The Envoy web server is small, one connection for polls and one spare
+LIMIT_PER_HOST = 2
+DNS_CACHE_TTL = 300
+
+
+async def _on_connection_create_start(
+    session: aiohttp.ClientSession,
+    context: SimpleNamespace,
+    params: aiohttp.TraceConnectionCreateStartParams,
+) -> None:
+    """Start timing a new connection."""
+    context.connect_start = time.perf_counter()
+
+
+async def _on_connection_create_end(
+    session: aiohttp.ClientSession,
+    context: SimpleNamespace,
+    params: aiohttp.TraceConnectionCreateEndParams,
+) -> None:
+    """Record the TCP and TLS setup time in the metrics of the request."""
+    if isinstance(metrics := context.trace_request_ctx, PollMetrics):
+        metrics.record(CONNECT, time.perf_counter() - context.connect_start)
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """Return a trace config timing new connections.
+
+    Only new connections are traced, kept-alive ones cost nothing.
+    """
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    return trace_config
+
+
+@callback
+def async_get_envoy_session(hass: HomeAssistant, host: str) -> aiohttp.ClientSession:
+    """Return the session dedicated to an Envoy host, creating it if needed.
+
+    The config flow, the coordinator and the reader of a host share it so they
+    reuse the same kept-alive TLS connection. Hosts are keyed as the reader
+    spells them, see normalize_host.
+    """
+    host = normalize_host(host)
+    sessions: dict[str, aiohttp.ClientSession] | None = hass.data.get(DATA_SESSIONS)
+    if sessions is None:
+        sessions = hass.data[DATA_SESSIONS] = {}
+
+        async def _async_close_sessions(event: Event) -> None:
+            for session in sessions.values():
+                await session.close()
+            sessions.clear()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, _async_close_sessions)
+
+    if (session := sessions.get(host)) is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            ssl=get_default_no_verify_context(),
+        )
+        session = sessions[host] = aiohttp.ClientSession(
+            connector=connector, trace_configs=[_trace_config()]
+        )
+
+    return session
+
+
+async def async_close_envoy_session(hass: HomeAssistant, host: str) -> None:
+    """Close the session of an Envoy host."""
+    host = normalize_host(host)
+    sessions: dict[str, aiohttp.ClientSession] = hass.data.get(DATA_SESSIONS, {})
+    if (session := sessions.pop(host, None)) is not None:
+        await session.close()
+
+
+@callback
+def async_store_validated_reader(
+    hass: HomeAssistant, host: str, reader: EnvoyReader
+) -> None:
+    """Keep a reader validated by the config flow for the entry setup."""
+    readers: dict[str, tuple[float, EnvoyReader]] = hass.data.setdefault(
+        DATA_VALIDATED_READERS, {}
+    )
+    readers[normalize_host(host)] = (time.monotonic(), reader)
+
+
+@callback
+def async_pop_validated_reader(
+    hass: HomeAssistant, host: str, token: str
+) -> EnvoyReader | None:
+    """Return the reader the config flow validated for a host and token.
+
+    It already holds the meters, the firmware and a session cookie, so the
+    setup does not repeat the requests of the validation.
+    """
+    readers: dict[str, tuple[float, EnvoyReader]] = hass.data.get(
+        DATA_VALIDATED_READERS, {}
+    )
+    if (validated := readers.pop(normalize_host(host), None)) is None:
+        return None
+    stored, reader = validated
+    if (
+        time.monotonic() - stored > VALIDATED_READER_TTL
+        or reader.enlighten_token != token
+    ):
+        return None
+    return reader
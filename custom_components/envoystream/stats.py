@@ -0,0 +1,176 @@
+"""Rolling statistics of the power values, kept in memory only."""
+
+from __future__ import annotations
+
+import math
+from array import array
+from collections import deque
+from collections.abc import Iterable
+from collections.abc import Mapping
+
+# Window name -> duration in seconds
+WINDOWS = {"1min": 60.0, "15min": 900.0}
+STATISTICS = ("min", "max", "mean", "peak")
+# Shortest spacing between the samples kept, the buffers are sized for it.
+# The stream pushes several frames per second, those in between are skipped
+MIN_SAMPLE_SPACING = 1.0
+
+
+class RollingWindow:
+    """Samples of the last duration seconds in a fixed size ring buffer.
+
+    The sum and the monotonic min and max queues are updated on each push
+    and eviction, so every statistic is read in constant time.
+    """
+
+    __slots__ = (
+        "_count",
+        "_head",
+        "_max",
+        "_min",
+        "_sum",
+        "_times",
+        "_values",
+        "capacity",
+        "duration",
+    )
+
+    def __init__(self, duration: float, capacity: int) -> None:
+        """Init an empty window."""
+        self.duration = duration
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        # Sequence number of the next sample, the oldest is _head - _count
+        self._head = 0
+        self._count = 0
+        self._sum = 0.0
+        # Sequence numbers of increasing (min) and decreasing (max) values
+        self._min: deque[int] = deque()
+        self._max: deque[int] = deque()
+
+    def __len__(self) -> int:
+        """Return the number of samples in the window."""
+        return self._count
+
+    def push(self, time: float, value: float) -> None:
+        """Add a sample taken at a monotonic time, evict the expired ones."""
+        self._evict(time - self.duration)
+        if self._count == self.capacity:
+            self._pop_oldest()
+
+        seq = self._head
+        slot = seq % self.capacity
+        self._times[slot] = time
+        self._values[slot] = value
+        self._head += 1
+        self._count += 1
+
+        if slot == 0:
+            # Start each lap from an exact sum so float errors do not pile up
+            self._sum = math.fsum(self._iter_values())
+        else:
+            self._sum += value
+
+        values = self._values
+        capacity = self.capacity
+        while self._min and values[self._min[-1] % capacity] >= value:
+            self._min.pop()
+        self._min.append(seq)
+        while self._max and values[self._max[-1] % capacity] <= value:
+            self._max.pop()
+        self._max.append(seq)
+
+    def _evict(self, before: float) -> None:
+        """Drop the samples taken before a time."""
+        times = self._times
+        while (
+            self._count and times[(self._head - self._count) % self.capacity] < before
+        ):
+            self._pop_oldest()
+
+    def _pop_oldest(self) -> None:
+        """Drop the oldest sample."""
+        seq = self._head - self._count
+        self._sum -= self._values[seq % self.capacity]
+        self._count -= 1
+        if self._min[0] == seq:
+            self._min.popleft()
+        if self._max[0] == seq:
+            self._max.popleft()
+
+    def _iter_values(self) -> Iterable[float]:
+        """Iterate over the values in the window, oldest first."""
+        for seq in range(self._head - self._count, self._head):
+            yield self._values[seq % self.capacity]
+
+    @property
+    def min(self) -> float | None:
+        """Return the smallest value of the window."""
+        return self._values[self._min[0] % self.capacity] if self._count else None
+
+    @property
+    def max(self) -> float | None:
+        """Return the largest value of the window."""
+        return self._values[self._max[0] % self.capacity] if self._count else None
+
+    @property
+    def mean(self) -> float | None:
+        """Return the mean value of the window."""
+        return self._sum / self._count if self._count else None
+
+    @property
+    def peak(self) -> float | None:
+        """Return the value of largest magnitude, keeping its sign."""
+        if not self._count:
+            return None
+        low, high = self.min, self.max
+        return low if abs(low) > abs(high) else high  # type: ignore[arg-type]
+
+    def statistic(self, name: str) -> float | None:
+        """Return a statistic by name."""
+        return getattr(self, name)
+
+
+class RollingStatistics:
+    """Rolling windows of each watched key."""
+
+    def __init__(self, keys: Iterable[str]) -> None:
+        """Init empty windows for the keys."""
+        self.windows: dict[str, dict[str, RollingWindow]] = {
+            key: self._new_windows() for key in keys
+        }
+        self._last_time = -math.inf
+
+    @staticmethod
+    def _new_windows() -> dict[str, RollingWindow]:
+        """Return empty windows for a key."""
+        return {
+            name: RollingWindow(duration, math.ceil(duration / MIN_SAMPLE_SPACING) + 1)
+            for name, duration in WINDOWS.items()
+        }
+
+    def retain(self, keys: Iterable[str]) -> None:
+        """Watch exactly these keys, keeping the windows of the known ones."""
+        self.windows = {
+            key: self.windows.get(key) or self._new_windows() for key in keys
+        }
+
+    def update(self, time: float, data: Mapping[str, float]) -> None:
+        """Add the values of one update taken at a monotonic time.
+
+        Updates closer than MIN_SAMPLE_SPACING to the last one kept are
+        skipped, so the windows hold their whole duration.
+        """
+        if time - self._last_time < MIN_SAMPLE_SPACING:
+            return
+        self._last_time = time
+        for key, windows in self.windows.items():
+            if (value := data.get(key)) is None:
+                continue
+            for window in windows.values():
+                window.push(time, value)
+
+    def get(self, key: str, window: str, statistic: str) -> float | None:
+        """Return a statistic of a key over a window."""
+        return self.windows[key][window].statistic(statistic)
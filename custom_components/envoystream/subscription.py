@@ -0,0 +1,90 @@
+"""Per subscriber delivery of every Envoy sample, outside the state machine."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Callable
+from collections.abc import Mapping
+
+# Called with the sample values, or the values changed since the last call
+SampleCallback = Callable[[Mapping[str, float]], None]
+
+
+class Subscription:
+    """Deliver samples to one subscriber, coalescing those it cannot take.
+
+    A sample is delivered on the next event loop iteration, and no sooner
+    than min_interval after the previous delivery. Samples arriving in
+    between replace the pending one, in delta mode their changes merge, so
+    a slow subscriber only ever gets the latest values.
+    """
+
+    __slots__ = (
+        "_callback",
+        "_delivered",
+        "_handle",
+        "_last_delivery",
+        "_loop",
+        "_pending",
+        "delta",
+        "min_interval",
+    )
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        update_callback: SampleCallback,
+        delta: bool = False,
+        min_interval: float = 0.0,
+    ) -> None:
+        """Init the subscription."""
+        self._loop = loop
+        self._callback = update_callback
+        self.delta = delta
+        self.min_interval = min_interval
+        self._pending: Mapping[str, float] | None = None
+        # Values the subscriber knows of, in delta mode
+        self._delivered: dict[str, float] = {}
+        self._handle: asyncio.Handle | None = None
+        self._last_delivery = -float("inf")
+
+    def push(self, data: Mapping[str, float]) -> None:
+        """Queue a sample, replacing or merging into the pending one."""
+        if self.delta:
+            delivered = self._delivered
+            changes = {
+                key: value for key, value in data.items() if delivered.get(key) != value
+            }
+            if not changes:
+                return
+            delivered.update(changes)
+            if self._pending is None:
+                self._pending = changes
+            else:
+                self._pending = {**self._pending, **changes}
+        else:
+            self._pending = data
+
+        if self._handle is None:
+            delay = self._last_delivery + self.min_interval - time.monotonic()
+            if delay > 0:
+                self._handle = self._loop.call_later(delay, self._deliver)
+            else:
+                self._handle = self._loop.call_soon(self._deliver)
+
+    def cancel(self) -> None:
+        """Drop the pending sample."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._pending = None
+
+    def _deliver(self) -> None:
+        """Hand the pending sample to the subscriber."""
+        self._handle = None
+        if (pending := self._pending) is None:
+            return
+        self._pending = None
+        self._last_delivery = time.monotonic()
+        self._callback(pending)
@@ -0,0 +1,54 @@
+"""Websocket API streaming the Envoy samples to the frontend and scripts."""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any
+
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import callback
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+@callback
+def async_setup_websocket(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, websocket_subscribe)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/subscribe",
+        vol.Required("entry_id"): str,
+        vol.Optional("delta", default=False): bool,
+        vol.Optional("min_interval", default=0.0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+    }
+)
+@callback
+def websocket_subscribe(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Send every sample of an Envoy as an event."""
+    if (coordinator := hass.data.get(DOMAIN, {}).get(msg["entry_id"])) is None:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, "Envoy entry not loaded"
+        )
+        return
+
+    @callback
+    def _async_forward(values: Mapping[str, float]) -> None:
+        connection.send_message(
+            websocket_api.event_message(msg["id"], {"values": dict(values)})
+        )
+
+    connection.subscriptions[msg["id"]] = coordinator.async_subscribe(
+        _async_forward, delta=msg["delta"], min_interval=msg["min_interval"]
+    )
+    connection.send_result(msg["id"])
@@ -0,0 +1 @@
+"""Tests for the envoystream integration."""
@@ -0,0 +1,179 @@
+"""Fixtures shared by the envoystream tests.
+
+The Home Assistant fixtures need pytest-homeassistant-custom-component, only
+the tests skipped without it use them.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import typing
+from pathlib import Path
+
+import pytest
+
+from custom_components.envoystream.capture import CaptureWriter
+
+if typing.TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+    from custom_components.envoystream.coordinator import EnvoyDataUpdateCoordinator
+    from custom_components.envoystream.envoy_reader import EnvoyReader
+
+PAYLOADS = Path(__file__).parents[1] / "benchmarks" / "payloads"
+
+HOST = "envoy.invalid"
+SERIAL_NUMBER = "122300000001"
+INVERTERS = [
+    {
+        "serialNumber": f"48221500000{index}",
+        "lastReportDate": 1760000000,
+        "devType": 1,
+        "lastReportWatts": 200 + index,
+        "maxReportWatts": 290,
+    }
+    for index in range(2)
+]
+
+
+@pytest.fixture
+def meters_payload() -> list[dict[str, typing.Any]]:
+    """Return a /ivp/meters payload of a three phase site."""
+    return json.loads((PAYLOADS / "meters_three_phase.json").read_text())
+
+
+@pytest.fixture
+def readings_payload() -> list[dict[str, typing.Any]]:
+    """Return a /ivp/meters/readings payload of the same site."""
+    return json.loads((PAYLOADS / "readings_three_phase.json").read_text())
+
+
+@pytest.fixture
+def meters(meters_payload: list[dict[str, typing.Any]]) -> dict[int, str]:
+    """Return the meter eids and their measurement type."""
+    return {meter["eid"]: meter["measurementType"] for meter in meters_payload}
+
+
+def _write_capture(
+    path: Path,
+    meters_payload: list[dict[str, typing.Any]],
+    readings_payload: list[dict[str, typing.Any]],
+    inverters: list[dict[str, typing.Any]] | None = None,
+) -> Path:
+    """Write a capture of the info, the meters and two readings."""
+    writer = CaptureWriter(path)
+    writer.start()
+    writer.record(
+        "/info.json",
+        0.01,
+        b"<envoy_info><device><sn>122300000001</sn>"
+        b"<software>D7.6.175</software></device></envoy_info>",
+    )
+    writer.record("/ivp/meters", 0.01, json.dumps(meters_payload).encode())
+    if inverters is not None:
+        writer.record(
+            "/api/v1/production/inverters", 0.01, json.dumps(inverters).encode()
+        )
+    for _ in range(2):
+        writer.record(
+            "/ivp/meters/readings", 0.01, json.dumps(readings_payload).encode()
+        )
+    writer.close()
+    return path
+
+
+@pytest.fixture
+def capture_file(
+    tmp_path: Path,
+    meters_payload: list[dict[str, typing.Any]],
+    readings_payload: list[dict[str, typing.Any]],
+) -> Path:
+    """Return a capture of the info, the meters and two readings."""
+    return _write_capture(
+        tmp_path / "envoy.capture.gz", meters_payload, readings_payload
+    )
+
+
+@pytest.fixture
+def site_capture_file(
+    tmp_path: Path,
+    meters_payload: list[dict[str, typing.Any]],
+    readings_payload: list[dict[str, typing.Any]],
+) -> Path:
+    """Return the same capture, with the inverters of the site."""
+    return _write_capture(
+        tmp_path / "site.capture.gz", meters_payload, readings_payload, INVERTERS
+    )
+
+
+@pytest.fixture
+def token() -> str:
+    """Return an Envoy token valid for a day."""
+    import jwt
+
+    return jwt.encode({"exp": int(time.time()) + 86400}, "secret", algorithm="HS256")
+
+
+@pytest.fixture
+def config_entry(hass: HomeAssistant, token: str) -> MockConfigEntry:
+    """Return an Envoy config entry added to Home Assistant.
+
+    The stream is off and the polls are slow, so the tests drive the
+    coordinator themselves.
+    """
+    from homeassistant.const import CONF_HOST
+    from homeassistant.const import CONF_TOKEN
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+    from custom_components.envoystream.const import CONF_SERIAL_NUMBER
+    from custom_components.envoystream.const import CONF_STREAM
+    from custom_components.envoystream.const import CONF_UPDATE_INTERVAL
+    from custom_components.envoystream.const import DOMAIN
+
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        title=f"Envoy {SERIAL_NUMBER}",
+        unique_id=SERIAL_NUMBER,
+        data={CONF_HOST: HOST, CONF_TOKEN: token, CONF_SERIAL_NUMBER: SERIAL_NUMBER},
+        options={CONF_STREAM: False, CONF_UPDATE_INTERVAL: 60},
+    )
+    entry.add_to_hass(hass)
+    return entry
+
+
+@pytest.fixture
+def validated_reader(
+    hass: HomeAssistant, config_entry: MockConfigEntry, site_capture_file: Path
+) -> EnvoyReader:
+    """Return the reader the entry sets up with, answered by the capture."""
+    from homeassistant.const import CONF_TOKEN
+
+    from custom_components.envoystream.capture import ReplaySource
+    from custom_components.envoystream.envoy_reader import EnvoyReader
+    from custom_components.envoystream.session import async_store_validated_reader
+
+    reader = EnvoyReader(
+        HOST,
+        enlighten_serial_num=SERIAL_NUMBER,
+        enlighten_token=config_entry.data[CONF_TOKEN],
+    )
+    reader.replay = ReplaySource(site_capture_file, speed=0)
+    async_store_validated_reader(hass, HOST, reader)
+    return reader
+
+
+@pytest.fixture
+async def coordinator(
+    hass: HomeAssistant,
+    config_entry: MockConfigEntry,
+    validated_reader: EnvoyReader,
+    mock_async_zeroconf: typing.Any,
+) -> EnvoyDataUpdateCoordinator:
+    """Set the entry up and return its coordinator."""
+    from custom_components.envoystream.const import DOMAIN
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    return hass.data[DOMAIN][config_entry.entry_id]
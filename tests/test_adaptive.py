@@ -0,0 +1,35 @@
+"""Tests for the adaptive poll interval."""
+
+from __future__ import annotations
+
+from custom_components.envoystream.adaptive import CHANGE_THRESHOLD
+from custom_components.envoystream.adaptive import WINDOW
+from custom_components.envoystream.adaptive import AdaptiveInterval
+
+
+def test_stretches_while_stable() -> None:
+    """Test the interval grows up to the ceiling while readings are flat."""
+    interval = AdaptiveInterval(2, 30)
+    for _ in range(WINDOW - 1):
+        assert interval.update({"production": 1000.0}) == 2
+
+    for _ in range(20):
+        interval.update({"production": 1000.0})
+
+    assert interval.interval == 30
+
+
+def test_snaps_back_on_change() -> None:
+    """Test a significant change returns to the floor."""
+    interval = AdaptiveInterval(2, 30)
+    for _ in range(20):
+        interval.update({"production": 1000.0})
+
+    assert interval.update({"production": 1000.0 + 2 * CHANGE_THRESHOLD}) == 2
+
+
+def test_without_signal_keys() -> None:
+    """Test readings without a watched key keep the interval."""
+    interval = AdaptiveInterval(2, 30)
+    for _ in range(20):
+        assert interval.update({"other": 1.0}) == 2
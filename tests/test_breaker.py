@@ -0,0 +1,106 @@
+"""Tests for the circuit breaker of the Envoy endpoints."""
+
+from __future__ import annotations
+
+import pytest
+
+from custom_components.envoystream import breaker
+from custom_components.envoystream.breaker import BACKOFF
+from custom_components.envoystream.breaker import FAILURE_THRESHOLD
+from custom_components.envoystream.breaker import CircuitBreaker
+
+
+class FakeClock:
+    """Monotonic clock moved by hand."""
+
+    def __init__(self) -> None:
+        """Init the clock."""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    """Drive the breaker from a fake clock."""
+    fake = FakeClock()
+    monkeypatch.setattr(breaker.time, "monotonic", fake)
+    return fake
+
+
+def _open(circuit: CircuitBreaker) -> None:
+    """Fail enough requests to open the circuit."""
+    for _ in range(FAILURE_THRESHOLD):
+        assert circuit.allow()
+        circuit.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock: FakeClock) -> None:
+    """Test the circuit refuses requests once the failures pile up."""
+    circuit = CircuitBreaker()
+    for _ in range(FAILURE_THRESHOLD - 1):
+        circuit.record_failure()
+    assert not circuit.is_open
+
+    circuit.record_failure()
+
+    assert circuit.is_open
+    assert not circuit.allow()
+    assert circuit.retry_in() == BACKOFF
+
+
+def test_success_resets_the_failures(clock: FakeClock) -> None:
+    """Test failures must be consecutive to open the circuit."""
+    circuit = CircuitBreaker()
+    for _ in range(FAILURE_THRESHOLD - 1):
+        circuit.record_failure()
+    circuit.record_success()
+    circuit.record_failure()
+
+    assert not circuit.is_open
+
+
+def test_probe_closes_the_circuit(clock: FakeClock) -> None:
+    """Test a single probe passes after the backoff and its success closes."""
+    circuit = CircuitBreaker()
+    _open(circuit)
+
+    clock.now += BACKOFF
+    assert circuit.allow()
+    # Only one probe at a time
+    assert not circuit.allow()
+
+    circuit.record_success()
+
+    assert not circuit.is_open
+    assert circuit.allow()
+
+
+def test_failed_probe_doubles_the_backoff(clock: FakeClock) -> None:
+    """Test a failed probe opens the circuit for twice as long."""
+    circuit = CircuitBreaker()
+    _open(circuit)
+
+    clock.now += BACKOFF
+    assert circuit.allow()
+    circuit.record_failure()
+
+    assert circuit.backoff == 2 * BACKOFF
+    clock.now += BACKOFF
+    assert not circuit.allow()
+    clock.now += BACKOFF
+    assert circuit.allow()
+
+
+def test_released_probe_allows_another(clock: FakeClock) -> None:
+    """Test a probe ending without result lets the next request probe."""
+    circuit = CircuitBreaker()
+    _open(circuit)
+    clock.now += BACKOFF
+    assert circuit.allow()
+
+    circuit.release()
+
+    assert circuit.allow()
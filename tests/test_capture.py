@@ -0,0 +1,61 @@
+"""Tests for the capture and replay of raw Envoy responses."""
+
+from __future__ import annotations
+
+import gzip
+from pathlib import Path
+
+import pytest
+
+from custom_components.envoystream.capture import CaptureWriter
+from custom_components.envoystream.capture import ReplaySource
+from custom_components.envoystream.capture import read_capture
+
+
+def test_capture_round_trip(capture_file: Path) -> None:
+    """Test the records are read back in order."""
+    records = list(read_capture(capture_file))
+
+    assert [record.endpoint for record in records] == [
+        "/info.json",
+        "/ivp/meters",
+        "/ivp/meters/readings",
+        "/ivp/meters/readings",
+    ]
+    assert records[0].latency == 0.01
+
+
+def test_truncated_capture(tmp_path: Path, capture_file: Path) -> None:
+    """Test a capture cut short is read up to its last complete record."""
+    data = gzip.decompress(capture_file.read_bytes())
+    truncated = tmp_path / "truncated.gz"
+    truncated.write_bytes(gzip.compress(data[:-5]))
+
+    assert len(list(read_capture(truncated))) == 3
+
+
+def test_close_after_the_thread_died(tmp_path: Path) -> None:
+    """Test close returns when the writer thread could not open its file."""
+    writer = CaptureWriter(tmp_path / "missing" / "envoy.capture.gz")
+    writer.start()
+    writer._thread.join()
+
+    writer.close()
+
+
+async def test_replay_serves_the_capture(capture_file: Path) -> None:
+    """Test each request gets the next body and the meters keep theirs."""
+    replay = ReplaySource(capture_file, speed=0)
+
+    first = await replay.async_get("/ivp/meters/readings")
+    await replay.async_get("/ivp/meters/readings")
+
+    assert first.startswith(b"[")
+    assert replay.exhausted
+    assert await replay.async_get("/ivp/meters") == await replay.async_get(
+        "/ivp/meters"
+    )
+    with pytest.raises(EOFError):
+        await replay.async_get("/ivp/meters/readings")
+    with pytest.raises(EOFError):
+        await replay.async_get("/production.json")
@@ -0,0 +1,104 @@
+"""Tests for the Envoy config flow."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import aiohttp
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant import config_entries  # noqa: E402
+from homeassistant.const import CONF_HOST  # noqa: E402
+from homeassistant.const import CONF_TOKEN  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.data_entry_flow import FlowResultType  # noqa: E402
+
+from custom_components.envoystream.capture import ReplaySource  # noqa: E402
+from custom_components.envoystream.const import CONF_SERIAL_NUMBER  # noqa: E402
+from custom_components.envoystream.const import DOMAIN  # noqa: E402
+from custom_components.envoystream.coordinator import (  # noqa: E402
+    EnvoyDataUpdateCoordinator,
+)
+from custom_components.envoystream.envoy_reader import EnvoyReader  # noqa: E402
+from custom_components.envoystream.session import (  # noqa: E402
+    async_pop_validated_reader,
+)
+
+from .conftest import HOST  # noqa: E402
+from .conftest import SERIAL_NUMBER  # noqa: E402
+
+# Setting the integration up for a flow sets zeroconf up too
+pytestmark = pytest.mark.usefixtures("mock_async_zeroconf")
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations: None) -> None:
+    """Enable the integration in every test."""
+
+
+@pytest.fixture
+def readers(capture_file: Path) -> Iterator[list[EnvoyReader]]:
+    """Answer the readers of the flow from the capture, return them."""
+    readers: list[EnvoyReader] = []
+
+    def _replay_reader(*args: Any, **kwargs: Any) -> EnvoyReader:
+        reader = EnvoyReader(*args, **kwargs)
+        reader.replay = ReplaySource(capture_file, speed=0)
+        readers.append(reader)
+        return reader
+
+    with patch(
+        "custom_components.envoystream.config_flow.EnvoyReader",
+        side_effect=_replay_reader,
+    ):
+        yield readers
+
+
+async def _async_submit(hass: HomeAssistant, token: str) -> dict[str, Any]:
+    """Submit the host and token of the user step, return the result."""
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_USER}
+    )
+    assert result["type"] is FlowResultType.FORM
+
+    with patch("custom_components.envoystream.async_setup_entry", return_value=True):
+        return await hass.config_entries.flow.async_configure(
+            result["flow_id"], {CONF_HOST: HOST, CONF_TOKEN: token}
+        )
+
+
+async def test_validated_reader_handed_to_the_entry(
+    hass: HomeAssistant, readers: list[EnvoyReader], token: str
+) -> None:
+    """Test the entry setup gets the reader the flow validated."""
+    result = await _async_submit(hass, token)
+
+    assert result["type"] is FlowResultType.CREATE_ENTRY
+    assert result["data"][CONF_SERIAL_NUMBER] == SERIAL_NUMBER
+    [reader] = readers
+    assert reader.keys
+    assert async_pop_validated_reader(hass, HOST, token) is reader
+
+
+async def test_failed_validation_hands_nothing_over(
+    hass: HomeAssistant, readers: list[EnvoyReader], token: str
+) -> None:
+    """Test a reader failing the validation is not kept for a setup."""
+    with patch.object(EnvoyReader, "get_meters", side_effect=aiohttp.ClientError):
+        result = await _async_submit(hass, token)
+
+    assert result["type"] is FlowResultType.FORM
+    assert result["errors"] == {"base": "cannot_connect"}
+    assert async_pop_validated_reader(hass, HOST, token) is None
+
+
+async def test_setup_uses_the_validated_reader(
+    coordinator: EnvoyDataUpdateCoordinator, validated_reader: EnvoyReader
+) -> None:
+    """Test the coordinator reads through the reader handed over."""
+    assert coordinator.envoy_reader is validated_reader
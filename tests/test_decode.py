@@ -0,0 +1,171 @@
+"""Tests for the decode plan of the meter readings and stream frames."""
+
+from __future__ import annotations
+
+import typing
+
+import pytest
+
+from custom_components.envoystream.decode import ChannelCountError
+from custom_components.envoystream.decode import DecodePlan
+from custom_components.envoystream.decode import index_inverters
+from custom_components.envoystream.decode import Quantity
+
+
+def _baseline_datas(
+    meters: dict[int, str], readings: list[dict[str, typing.Any]]
+) -> dict[str, float]:
+    """Return the values get_datas returned before the decode plan."""
+    result: dict[str, float] = {}
+    phase_count = 0
+    for reading in readings:
+        reading_type = meters[reading["eid"]]
+        result[reading_type] = reading["instantaneousDemand"]
+        for number, phase in enumerate(reading["channels"], 1):
+            result[f"{reading_type}_phase_{number}"] = phase["instantaneousDemand"]
+        phase_count = len(reading["channels"])
+    result["total_consumption"] = result["production"] + result["net-consumption"]
+    for i in range(1, phase_count + 1):
+        result[f"total_consumption_phase_{i}"] = (
+            result[f"production_phase_{i}"] + result[f"net-consumption_phase_{i}"]
+        )
+    return result
+
+
+def _frame(meters: dict[int, str], power: float) -> dict[str, typing.Any]:
+    """Return a stream frame with the same power on every phase."""
+    return {
+        reading_type: {phase: {"p": power} for phase in ("ph-a", "ph-b", "ph-c")}
+        for reading_type in meters.values()
+    }
+
+
+def test_readings_keep_baseline_keys_and_values(meters, readings_payload) -> None:
+    """Test every key of the original get_datas keeps its name and value."""
+    plan = DecodePlan(meters, dict.fromkeys(meters, 3))
+    data = plan.decode_readings(readings_payload)
+
+    baseline = _baseline_datas(meters, readings_payload)
+    assert {key: data[key] for key in baseline} == pytest.approx(baseline)
+    assert plan.quantities[plan.index["production"]] is Quantity.POWER
+
+
+def test_derived_metrics_skipped_without_their_meters(readings_payload) -> None:
+    """Test a production only site gets no consumption metrics."""
+    meters = {704643328: "production"}
+    plan = DecodePlan(meters, {704643328: 3})
+    data = plan.decode_readings(readings_payload[:1])
+
+    assert "production" in data
+    assert "production_energy" in data
+    for key in (
+        "total_consumption",
+        "total_consumption_energy",
+        "grid_import",
+        "self_consumption",
+        "self_sufficiency",
+        "total_consumption_phase_imbalance",
+    ):
+        assert key not in plan.index
+
+
+def test_derived_metrics_computed(meters, readings_payload) -> None:
+    """Test the derived metrics follow the meter values."""
+    data = DecodePlan(meters, dict.fromkeys(meters, 3)).decode_readings(
+        readings_payload
+    )
+
+    net = data["net-consumption"]
+    assert data["grid_import"] == max(net, 0.0)
+    assert data["grid_export"] == max(-net, 0.0)
+    assert data["total_consumption_energy"] == pytest.approx(
+        data["production_energy"]
+        + data["net-consumption_import_energy"]
+        - data["net-consumption_export_energy"]
+    )
+
+
+def test_stream_frame_keeps_the_reading_values(meters, readings_payload) -> None:
+    """Test stream frames update power and keep the energy of the readings."""
+    plan = DecodePlan(meters, dict.fromkeys(meters, 3))
+    readings = plan.decode_readings(readings_payload)
+
+    data = plan.decode_stream_frame(_frame(meters, 100.0), readings)
+
+    assert len(data) == len(readings)
+    assert data["production"] == 300.0
+    assert data["production_phase_1"] == 100.0
+    assert data["production_energy"] == readings["production_energy"]
+    assert data["total_consumption"] == 600.0
+
+
+def test_stream_frame_after_plan_rebuild(meters, readings_payload) -> None:
+    """Test a rebuilt plan still carries the values of older readings over."""
+    readings = DecodePlan(meters, dict.fromkeys(meters, 3)).decode_readings(
+        readings_payload
+    )
+    rebuilt = DecodePlan(meters, dict.fromkeys(meters, 3))
+
+    data = rebuilt.decode_stream_frame(_frame(meters, 100.0), readings)
+
+    assert set(data) == set(readings)
+    assert data["production"] == 300.0
+    assert data["production_energy"] == readings["production_energy"]
+
+
+def test_stream_frame_without_readings(meters) -> None:
+    """Test a frame alone only holds the power keys."""
+    plan = DecodePlan(meters, dict.fromkeys(meters, 3))
+
+    data = plan.decode_stream_frame(_frame(meters, 100.0))
+
+    assert "production" in data
+    assert "production_energy" not in data
+
+
+def test_channel_count_change_raises(meters, readings_payload) -> None:
+    """Test readings with other channel counts than the plan raise."""
+    plan = DecodePlan(meters, dict.fromkeys(meters, 1))
+
+    with pytest.raises(ChannelCountError) as err:
+        plan.decode_readings(readings_payload)
+    assert err.value.count == 3
+
+
+def test_unknown_meter_flags_topology(meters, readings_payload) -> None:
+    """Test readings of a meter the plan does not know flag a mismatch."""
+    eid, reading_type = next(iter(meters.items()))
+    plan = DecodePlan({eid: reading_type}, {eid: 3})
+
+    plan.decode_readings(readings_payload)
+
+    assert plan.topology_mismatch
+
+
+def test_quality_fields_only_when_selected(meters, readings_payload) -> None:
+    """Test power quality keys are only decoded once selected."""
+    channels = dict.fromkeys(meters, 3)
+    assert "production_voltage" not in DecodePlan(meters, channels).index
+
+    plan = DecodePlan(meters, channels, {"voltage": 0})
+    data = plan.decode_readings(readings_payload)
+
+    assert data["production_voltage"] == readings_payload[0]["voltage"]
+    assert plan.quantities[plan.index["production_voltage"]] is Quantity.VOLTAGE
+
+
+def test_index_inverters() -> None:
+    """Test inverter reports are indexed by serial number."""
+    report = {"serialNumber": "1", "lastReportDate": 1, "lastReportWatts": 5}
+
+    assert index_inverters([report]) == {"1": report}
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [{"status": 401, "error": "Unauthorized"}, [{"lastReportWatts": 5}], ["1"]],
+)
+def test_index_inverters_rejects_unexpected_payloads(payload: typing.Any) -> None:
+    """Test payloads other than inverter reports raise ValueError."""
+    with pytest.raises(ValueError):
+        index_inverters(payload)
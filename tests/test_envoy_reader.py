@@ -0,0 +1,95 @@
+"""Tests for the Envoy reader, fed from a capture."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import aiohttp
+import pytest
+
+from custom_components.envoystream.capture import CaptureWriter
+from custom_components.envoystream.capture import ReplaySource
+from custom_components.envoystream.envoy_reader import EnvoyReader
+from custom_components.envoystream.envoy_reader import normalize_host
+
+
+@pytest.fixture
+def reader(capture_file: Path) -> EnvoyReader:
+    """Return a reader answered by the capture instead of an Envoy."""
+    reader = EnvoyReader("replay.invalid")
+    reader.replay = ReplaySource(capture_file, speed=0)
+    return reader
+
+
+async def test_serial_number(reader: EnvoyReader) -> None:
+    """Test the serial number and firmware come from the info."""
+    async with aiohttp.ClientSession() as session:
+        assert await reader.get_full_serial_number(session) == (
+            "122300000001",
+            "D7.6.175",
+        )
+
+
+async def test_get_datas(reader: EnvoyReader) -> None:
+    """Test the readings are decoded with the meters of the Envoy."""
+    async with aiohttp.ClientSession() as session:
+        data = await reader.get_datas(session)
+
+    assert set(reader.keys) >= {"production", "net-consumption", "total_consumption"}
+    assert data["total_consumption"] == pytest.approx(
+        data["production"] + data["net-consumption"]
+    )
+
+
+async def test_unchanged_meters_keep_the_plan(reader: EnvoyReader) -> None:
+    """Test refreshing the same meters does not rebuild the decode plan."""
+    async with aiohttp.ClientSession() as session:
+        data = await reader.get_datas(session)
+        plan = reader._plan
+        assert plan is not None
+        plan.topology_mismatch = True
+
+        await reader.get_meters(session, refresh=True)
+        frame = {"production": {"ph-a": {"p": 10.0}}}
+
+        assert reader._plan is plan
+        assert not reader.topology_changed
+        assert set(plan.decode_stream_frame(frame, data)) == set(data)
+
+
+def test_ipv6_host() -> None:
+    """Test IPv6 hosts are enclosed in brackets."""
+    assert EnvoyReader("FE80::1").host == "[fe80::1]"
+
+
+@pytest.mark.parametrize(
+    ("host", "normalized"),
+    [
+        ("Envoy.Local", "envoy.local"),
+        ("FE80::1", "[fe80::1]"),
+        ("[fe80::1]", "[fe80::1]"),
+    ],
+)
+def test_normalize_host(host: str, normalized: str) -> None:
+    """Test hosts are keyed as the reader spells them, idempotently."""
+    assert normalize_host(host) == normalized
+
+
+async def test_forced_endpoint_refresh_skips_the_cache(tmp_path: Path) -> None:
+    """Test timed refreshes fetch the endpoint even while it is cached."""
+    path = tmp_path / "production.capture.gz"
+    writer = CaptureWriter(path)
+    writer.start()
+    for watts in (1, 2):
+        writer.record("/api/v1/production", 0.01, f'{{"wattsNow": {watts}}}'.encode())
+    writer.close()
+    reader = EnvoyReader("replay.invalid")
+    reader.replay = ReplaySource(path, speed=0)
+
+    async with aiohttp.ClientSession() as session:
+        first = await reader.get_endpoint("production", session)
+        cached = await reader.get_endpoint("production", session)
+        forced = await reader.get_endpoint("production", session, force=True)
+
+    assert first == cached == {"wattsNow": 1}
+    assert forced == {"wattsNow": 2}
@@ -0,0 +1,75 @@
+"""Tests for the batched line protocol export."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+
+from custom_components.envoystream.export import ExportSink
+from custom_components.envoystream.export import format_line
+
+
+class FakeSender:
+    """Collect the sent batches, failing the first ones if asked to."""
+
+    def __init__(self, failures: int = 0) -> None:
+        """Init the sender."""
+        self.batches: list[bytes] = []
+        self.failures = failures
+
+    async def __call__(self, payload: bytes) -> None:
+        """Send a batch."""
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("unreachable")
+        self.batches.append(payload)
+
+
+def test_format_line() -> None:
+    """Test a reading becomes one line holding all its keys."""
+    assert (
+        format_line("serial=1", {"production": 1.5, "net-consumption": -2.0}, 7)
+        == "envoy,serial=1 production=1.5,net-consumption=-2.0 7"
+    )
+    assert format_line("serial=1", {}, 7) is None
+
+
+def test_full_queue_drops_the_oldest() -> None:
+    """Test the queue keeps the newest lines once full."""
+    sink = ExportSink(FakeSender(), "1", max_pending=2)
+    for value in range(3):
+        sink.record({"production": float(value)}, value)
+
+    assert sink.as_dict()["dropped"] == 1
+    assert sink.as_dict()["pending"] == 2
+
+
+async def test_flush_sends_in_batches() -> None:
+    """Test the queued lines are sent in batches of batch_size."""
+    sender = FakeSender()
+    sink = ExportSink(sender, "1", batch_size=2)
+    for value in range(3):
+        sink.record({"production": float(value)}, value)
+
+    await sink.async_flush()
+
+    assert [batch.count(b"\n") + 1 for batch in sender.batches] == [2, 1]
+    assert sink.sent == 3
+
+
+async def test_run_retries_failed_batches(monkeypatch) -> None:
+    """Test a failed batch is sent again instead of being lost."""
+    monkeypatch.setattr("custom_components.envoystream.export.RETRY_BACKOFF", 0.0)
+    sender = FakeSender(failures=1)
+    sink = ExportSink(sender, "1", flush_interval=0.0)
+    task = asyncio.create_task(sink.async_run())
+
+    sink.record({"production": 1.0}, 1)
+    for _ in range(10):
+        await asyncio.sleep(0)
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+    assert sender.batches == [b"envoy,serial=1 production=1.0 1"]
+    assert sink.failures == 1
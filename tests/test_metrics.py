@@ -0,0 +1,32 @@
+"""Tests for the timing histograms of the poll hot path."""
+
+from __future__ import annotations
+
+from custom_components.envoystream.metrics import POLL
+from custom_components.envoystream.metrics import Histogram
+from custom_components.envoystream.metrics import PollMetrics
+
+
+def test_percentile_is_a_bucket_bound() -> None:
+    """Test percentiles return the bound of their bucket, capped at max."""
+    histogram = Histogram()
+    for seconds in (0.002,) * 95 + (0.3,) * 5:
+        histogram.record(seconds)
+
+    assert histogram.percentile(50) == 0.0025
+    assert histogram.percentile(99) == 0.3
+    assert Histogram().percentile(95) is None
+
+
+def test_recent_window_restarts() -> None:
+    """Test take_recent only holds the durations since the previous call."""
+    metrics = PollMetrics()
+    metrics.record(POLL, 1.0)
+    recent = metrics.take_recent(POLL)
+
+    metrics.record(POLL, 0.01)
+
+    assert recent is not None and recent.count == 1
+    assert metrics.take_recent(POLL).max == 0.01  # type: ignore[union-attr]
+    assert metrics.take_recent(POLL) is None
+    assert metrics.histograms[POLL].count == 2
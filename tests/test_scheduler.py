@@ -0,0 +1,71 @@
+"""Tests for the domain scheduler staggering the Envoy polls."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.core import CALLBACK_TYPE  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from custom_components.envoystream.scheduler import async_get_scheduler  # noqa: E402
+from custom_components.envoystream.scheduler import EnvoyScheduler  # noqa: E402
+
+
+class _Coordinator:
+    """Coordinator of an Envoy, as far as the scheduler sees it."""
+
+    def __init__(self, entry_id: str, interval: float) -> None:
+        self.entry = SimpleNamespace(entry_id=entry_id, title=entry_id)
+        self.poll_interval = timedelta(seconds=interval)
+        self.polling = True
+        self.last_update_success = True
+        self.data = None
+
+    def async_add_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        return lambda: None
+
+
+def _gap(scheduler: EnvoyScheduler, first: str, second: str) -> float:
+    """Return the seconds from the poll of an Envoy to that of another."""
+    interval = scheduler._members[first].poll_interval.total_seconds()
+    handles = scheduler._handles
+    return (handles[second].when() - handles[first].when()) % interval
+
+
+async def test_polls_spread_over_the_interval(hass: HomeAssistant) -> None:
+    """Test the polls of several Envoys are spread evenly over the interval."""
+    scheduler = async_get_scheduler(hass)
+    removers = [
+        scheduler.async_add(_Coordinator(entry_id, 10))  # type: ignore[arg-type]
+        for entry_id in ("a", "b")
+    ]
+
+    assert _gap(scheduler, "a", "b") == pytest.approx(5)
+
+    for remove in removers:
+        remove()
+
+
+async def test_removed_envoy_respreads_the_polls(hass: HomeAssistant) -> None:
+    """Test the remaining Envoys take the freed phases."""
+    scheduler = async_get_scheduler(hass)
+    removers = {
+        entry_id: scheduler.async_add(_Coordinator(entry_id, 12))  # type: ignore[arg-type]
+        for entry_id in ("a", "b", "c")
+    }
+    assert _gap(scheduler, "a", "b") == pytest.approx(4)
+    assert _gap(scheduler, "a", "c") == pytest.approx(8)
+
+    removers.pop("a")()
+
+    assert set(scheduler._handles) == {"b", "c"}
+    assert _gap(scheduler, "b", "c") == pytest.approx(6)
+
+    for remove in removers.values():
+        remove()
+    assert not scheduler._handles
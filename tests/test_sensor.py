@@ -0,0 +1,204 @@
+"""Tests for the Envoy sensor entities."""
+
+from __future__ import annotations
+
+import json
+import typing
+from pathlib import Path
+from unittest.mock import patch
+
+import aiohttp
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN  # noqa: E402
+from homeassistant.const import STATE_UNAVAILABLE  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.core import State  # noqa: E402
+from homeassistant.helpers import entity_registry as er  # noqa: E402
+
+from custom_components.envoystream.capture import CaptureWriter  # noqa: E402
+from custom_components.envoystream.capture import ReplaySource  # noqa: E402
+from custom_components.envoystream.const import DOMAIN  # noqa: E402
+from custom_components.envoystream.session import (  # noqa: E402
+    async_store_validated_reader,
+)
+from custom_components.envoystream.coordinator import (  # noqa: E402
+    EnvoyDataUpdateCoordinator,
+)
+
+from .conftest import HOST  # noqa: E402
+from .conftest import INVERTERS  # noqa: E402
+from .conftest import SERIAL_NUMBER  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations: None) -> None:
+    """Enable the integration in every test."""
+
+
+def _get_entity_id(hass: HomeAssistant, key: str) -> str | None:
+    """Return the entity id of the sensor of a get_datas key."""
+    return er.async_get(hass).async_get_entity_id(
+        SENSOR_DOMAIN, DOMAIN, f"{SERIAL_NUMBER}_{key}"
+    )
+
+
+def _get_state(hass: HomeAssistant, key: str) -> State:
+    """Return the state of the sensor of a get_datas key."""
+    entity_id = _get_entity_id(hass, key)
+    assert entity_id is not None
+    state = hass.states.get(entity_id)
+    assert state is not None
+    return state
+
+
+async def test_power_within_deadband_not_written(
+    hass: HomeAssistant, coordinator: EnvoyDataUpdateCoordinator
+) -> None:
+    """Test a power change inside the deadband does not write the state."""
+    written = _get_state(hass, "production")
+    production = coordinator.data["production"]
+
+    coordinator.async_set_updated_data(
+        {**coordinator.data, "production": production + 1}
+    )
+    await hass.async_block_till_done()
+
+    state = _get_state(hass, "production")
+    assert state.state == written.state
+    assert state.last_reported == written.last_reported
+
+
+async def test_power_outside_deadband_written(
+    hass: HomeAssistant, coordinator: EnvoyDataUpdateCoordinator
+) -> None:
+    """Test a power change past the deadband writes the state."""
+    production = coordinator.data["production"]
+
+    coordinator.async_set_updated_data(
+        {**coordinator.data, "production": production + 1}
+    )
+    coordinator.async_set_updated_data(
+        {**coordinator.data, "production": production + 100}
+    )
+    await hass.async_block_till_done()
+
+    assert float(_get_state(hass, "production").state) == pytest.approx(
+        production + 100
+    )
+
+
+async def test_deadband_keeps_the_written_reference(
+    hass: HomeAssistant, coordinator: EnvoyDataUpdateCoordinator
+) -> None:
+    """Test small steps adding up past the deadband write the state."""
+    written = _get_state(hass, "production")
+    production = coordinator.data["production"]
+
+    for step in range(1, 30):
+        coordinator.async_set_updated_data(
+            {**coordinator.data, "production": production + step}
+        )
+    await hass.async_block_till_done()
+
+    state = _get_state(hass, "production")
+    assert state.last_reported != written.last_reported
+    assert float(state.state) > production
+
+
+async def test_dropped_poll_serves_the_last_sample_without_writes(
+    hass: HomeAssistant, coordinator: EnvoyDataUpdateCoordinator
+) -> None:
+    """Test a failed poll keeps the sensors available and writes nothing."""
+    written = _get_state(hass, "production")
+
+    with patch.object(
+        coordinator.envoy_reader, "get_datas", side_effect=aiohttp.ClientError
+    ):
+        await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert coordinator.last_update_success
+    assert coordinator.serving_stale
+    state = _get_state(hass, "production")
+    assert state.state == written.state
+    assert state.last_reported == written.last_reported
+
+
+async def test_dropped_poll_without_stale_budget(
+    hass: HomeAssistant, coordinator: EnvoyDataUpdateCoordinator
+) -> None:
+    """Test a stale budget of 0 makes the sensors unavailable on a failed poll."""
+    coordinator.stale_budget = 0
+
+    with patch.object(
+        coordinator.envoy_reader, "get_datas", side_effect=aiohttp.ClientError
+    ):
+        await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert not coordinator.serving_stale
+    assert _get_state(hass, "production").state == STATE_UNAVAILABLE
+
+
+async def test_meter_changes_add_and_retire_sensors(
+    hass: HomeAssistant,
+    coordinator: EnvoyDataUpdateCoordinator,
+    tmp_path: Path,
+    meters_payload: list[dict[str, typing.Any]],
+) -> None:
+    """Test a rediscovery retires the sensors of a removed meter and adds them back."""
+    reader = coordinator.envoy_reader
+    replay = reader.replay
+    path = tmp_path / "production_only.capture.gz"
+    writer = CaptureWriter(path)
+    writer.start()
+    production = [m for m in meters_payload if m["measurementType"] == "production"]
+    writer.record("/ivp/meters", 0.01, json.dumps(production).encode())
+    writer.close()
+    assert _get_entity_id(hass, "net-consumption") is not None
+
+    reader.replay = ReplaySource(path, speed=0)
+    await coordinator.async_rediscover()
+    await hass.async_block_till_done()
+
+    assert _get_entity_id(hass, "net-consumption") is None
+    assert _get_entity_id(hass, "total_consumption") is None
+    assert _get_entity_id(hass, "production") is not None
+
+    reader.replay = replay
+    await coordinator.async_rediscover()
+    await hass.async_block_till_done()
+
+    assert _get_entity_id(hass, "net-consumption") is not None
+    assert _get_entity_id(hass, "total_consumption") is not None
+
+
+async def test_inverters_fetched_on_the_first_setup_only(
+    hass: HomeAssistant, coordinator: EnvoyDataUpdateCoordinator
+) -> None:
+    """Test registered inverters are restored without asking the Envoy."""
+    entity_registry = er.async_get(hass)
+    serials = [inverter["serialNumber"] for inverter in INVERTERS]
+    for serial in serials:
+        entity_id = entity_registry.async_get_entity_id(
+            SENSOR_DOMAIN, DOMAIN, f"{serial}_power"
+        )
+        assert entity_id is not None
+        entry = entity_registry.async_get(entity_id)
+        assert entry is not None
+        assert entry.disabled_by is er.RegistryEntryDisabler.INTEGRATION
+
+    reader = coordinator.envoy_reader
+    async_store_validated_reader(hass, HOST, reader)
+    with patch.object(reader, "get_endpoint") as get_endpoint:
+        assert await hass.config_entries.async_reload(coordinator.entry.entry_id)
+        await hass.async_block_till_done()
+
+    get_endpoint.assert_not_called()
+    for serial in serials:
+        assert entity_registry.async_get_entity_id(
+            SENSOR_DOMAIN, DOMAIN, f"{serial}_last_report"
+        )
@@ -0,0 +1,76 @@
+"""Tests for the rolling statistics of the power values."""
+
+from __future__ import annotations
+
+import pytest
+
+from custom_components.envoystream.stats import RollingStatistics
+from custom_components.envoystream.stats import RollingWindow
+
+
+def test_window_statistics() -> None:
+    """Test min, max, mean and peak of the samples in the window."""
+    window = RollingWindow(60.0, 61)
+    for time, value in enumerate((10.0, -50.0, 30.0)):
+        window.push(float(time), value)
+
+    assert window.min == -50.0
+    assert window.max == 30.0
+    assert window.mean == pytest.approx(-10 / 3)
+    assert window.peak == -50.0
+
+
+def test_window_evicts_expired_samples() -> None:
+    """Test samples older than the duration leave the statistics."""
+    window = RollingWindow(10.0, 11)
+    window.push(0.0, 100.0)
+    window.push(5.0, 1.0)
+
+    window.push(12.0, 2.0)
+
+    assert len(window) == 2
+    assert window.max == 2.0
+    assert window.mean == 1.5
+
+
+def test_window_ring_buffer_wraps() -> None:
+    """Test a full buffer drops its oldest sample."""
+    window = RollingWindow(1000.0, 4)
+    for time in range(10):
+        window.push(float(time), float(time))
+
+    assert len(window) == 4
+    assert window.min == 6.0
+    assert window.mean == 7.5
+
+
+def test_empty_window() -> None:
+    """Test an empty window has no statistic."""
+    window = RollingWindow(60.0, 61)
+
+    assert window.min is None
+    assert window.mean is None
+    assert window.peak is None
+
+
+def test_fast_updates_are_downsampled() -> None:
+    """Test stream frames several times a second still fill the window span."""
+    statistics = RollingStatistics(["production"])
+    for frame in range(4 * 1000):
+        statistics.update(frame / 4, {"production": float(frame)})
+
+    window = statistics.windows["production"]["15min"]
+    assert len(window) == 901
+    assert statistics.get("production", "15min", "min") == 4 * 99
+
+
+def test_retain_keeps_known_windows() -> None:
+    """Test retain keeps the samples of kept keys and adds new ones."""
+    statistics = RollingStatistics(["production", "net-consumption"])
+    statistics.update(0.0, {"production": 5.0, "net-consumption": 1.0})
+
+    statistics.retain(["production", "total_consumption"])
+
+    assert set(statistics.windows) == {"production", "total_consumption"}
+    assert statistics.get("production", "1min", "max") == 5.0
+    assert statistics.get("total_consumption", "1min", "max") is None
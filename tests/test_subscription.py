@@ -0,0 +1,67 @@
+"""Tests for the per subscriber delivery of the samples."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Mapping
+
+from custom_components.envoystream.subscription import Subscription
+
+
+async def test_coalesces_samples_until_delivery() -> None:
+    """Test only the latest sample reaches a subscriber in between."""
+    received: list[Mapping[str, float]] = []
+    subscription = Subscription(asyncio.get_running_loop(), received.append)
+
+    subscription.push({"production": 1.0})
+    subscription.push({"production": 2.0})
+    await asyncio.sleep(0)
+
+    assert received == [{"production": 2.0}]
+
+
+async def test_delta_merges_changes() -> None:
+    """Test delta mode only delivers the changed values, merged."""
+    received: list[Mapping[str, float]] = []
+    subscription = Subscription(asyncio.get_running_loop(), received.append, delta=True)
+
+    subscription.push({"production": 1.0, "net-consumption": 5.0})
+    await asyncio.sleep(0)
+    subscription.push({"production": 2.0, "net-consumption": 5.0})
+    subscription.push({"production": 2.0, "net-consumption": 6.0})
+    subscription.push({"production": 2.0, "net-consumption": 6.0})
+    await asyncio.sleep(0)
+
+    assert received == [
+        {"production": 1.0, "net-consumption": 5.0},
+        {"production": 2.0, "net-consumption": 6.0},
+    ]
+
+
+async def test_min_interval_delays_delivery() -> None:
+    """Test samples are held back until min_interval has passed."""
+    received: list[Mapping[str, float]] = []
+    subscription = Subscription(
+        asyncio.get_running_loop(), received.append, min_interval=0.05
+    )
+
+    subscription.push({"production": 1.0})
+    await asyncio.sleep(0)
+    subscription.push({"production": 2.0})
+    await asyncio.sleep(0)
+    assert received == [{"production": 1.0}]
+
+    await asyncio.sleep(0.1)
+    assert received == [{"production": 1.0}, {"production": 2.0}]
+
+
+async def test_cancel_drops_pending() -> None:
+    """Test a cancelled subscription delivers nothing more."""
+    received: list[Mapping[str, float]] = []
+    subscription = Subscription(asyncio.get_running_loop(), received.append)
+
+    subscription.push({"production": 1.0})
+    subscription.cancel()
+    await asyncio.sleep(0)
+
+    assert received == []